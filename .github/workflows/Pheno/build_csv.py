@@ -1,9 +1,21 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import pickle
 import re
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+# Shared stage timing lives at the repo root; this script runs from its own directory
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..")
+sys.path.insert(0, REPO_ROOT)
+import rollups
+import shared_data
+import timing
+import weather
+
 ###############################################################################
 # CONFIGURATION
 ###############################################################################
@@ -11,6 +23,19 @@ from datetime import datetime
 # Output filename
 OUTPUT_FILE = "PHENOLOGY_LONG_FORMAT.csv"
 
+# Parsed rows per workbook, keyed by content hash; only changed workbooks are re-parsed
+CACHE_DIR = ".parse_cache"
+# Bump when the parsers change so cached rows are rebuilt
+PARSER_VERSION = "2"
+
+# The phenology file the dashboard loads (tab-separated), and where it looks for the day / ISO week / month
+# rollups and the memory-mapped copy its sessions share; precomputed here so its first load finds them
+DASHBOARD_FILE = os.path.join(REPO_ROOT, "historical_pheno_data.csv")
+ROLLUP_DIR = os.path.join(REPO_ROOT, rollups.ROLLUP_DIR)
+SHARED_DIR = os.path.join(REPO_ROOT, shared_data.SHARED_DIR)
+# Daily climate table (weather.py backfill) joined onto every observation when publishing
+CLIMATE_FILE = os.path.join(REPO_ROOT, weather.CLIMATE_FILE)
+
 # Columns for final long-format dataset
 COLUMNS = [
     "OBSERVATIONDATETIME",
@@ -23,6 +48,9 @@ COLUMNS = [
     "NOTES"
 ]
 
+# A header string is only a date if it carries a year ("Jul." or "Dec. 12" are not)
+DATE_WITH_YEAR = r"\b\d{4}\b|\b\d{1,2}[/-]\d{1,2}[/-]\d{2}\b"
+
 # USDA scientific name lookup (expand as needed)
 USDA = {
     "frogfruit": "Phyla nodiflora",
@@ -81,131 +109,246 @@ def scientific_name(common):
     key = clean_name(common)
     return USDA.get(key, "")
 
-def extract_date(cell):
-    if isinstance(cell, datetime):
-        return cell.date()
-    if isinstance(cell, str):
-        try:
-            return pd.to_datetime(cell).date()
-        except:
-            return None
-    return None
-
-def is_wedge_row(value):
-    return isinstance(value, (int, float)) and not pd.isna(value)
+def scientific_names(common):
+    """Vectorized scientific_name over a Series of common names."""
+    return common.str.strip().str.lower().map(USDA).fillna("")
+
+def cell_types(values):
+    """Python type of every cell in a flat object array."""
+    return pd.Series(values, dtype=object).map(type).to_numpy()
+
+def is_instance(types, classes):
+    """Boolean mask of cells whose type is a subclass of `classes` (checked once per distinct type)."""
+    matching = [t for t in pd.unique(types) if issubclass(t, classes)]
+    return np.isin(types, matching)
+
+def sheet_dates(df):
+    """
+    Whole-sheet date coercion: a datetime64 array shaped like df, NaT where a
+    cell is neither a datetime nor a date-like string. Each distinct string
+    is parsed once.
+    """
+    values = df.to_numpy(dtype=object).ravel()
+    types = cell_types(values)
+    dates = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[ns]")
+
+    is_dt = is_instance(types, datetime)
+    if is_dt.any():
+        dates[is_dt] = pd.to_datetime(pd.Series(values[is_dt], dtype=object)).to_numpy(dtype="datetime64[ns]")
+
+    is_str = is_instance(types, str)
+    if is_str.any():
+        strings = pd.Series(values[is_str], dtype=object)
+        unique = pd.Series(strings.unique(), dtype=object)
+        # Only strings carrying a year go to the (slow) date parser; "April 14,2023" needs its space back
+        candidates = unique[unique.str.contains(DATE_WITH_YEAR)].str.replace(r",(?=\S)", ", ", regex=True)
+        parsed = pd.Series(pd.NaT, index=unique.index, dtype="datetime64[ns]")
+        parsed[candidates.index] = pd.to_datetime(candidates, format="mixed", errors="coerce")
+        dates[is_str] = parsed.to_numpy()[pd.Index(unique).get_indexer(strings)]
+
+    return dates.reshape(df.shape)
+
+def find_date_columns(df):
+    """{column: date} for every column holding a date, taken from its first date-like cell."""
+    dates = sheet_dates(df)
+    has_date = ~np.isnat(dates)
+    first_row = has_date.argmax(axis=0)
+    return {
+        col: pd.Timestamp(dates[first_row[j], j]).date()
+        for j, col in enumerate(df.columns)
+        if has_date[first_row[j], j]
+    }
+
+def is_wedge_row(column):
+    """Rows whose first cell is a wedge number."""
+    types = cell_types(column.to_numpy(dtype=object))
+    return is_instance(types, (int, float)) & column.notna().to_numpy()
+
+def nonblank_strings(values):
+    """Mask of cells that are strings with something besides whitespace."""
+    values = pd.Series(values, dtype=object)
+    is_str = is_instance(cell_types(values.to_numpy()), str)
+    return is_str & (values.where(is_str, "").str.strip() != "").to_numpy()
 
 ###############################################################################
 # PARSE A SINGLE GARDEN FILE
 ###############################################################################
 
 def parse_garden(filepath):
-    df = pd.read_excel(filepath, header=None)
-    rows = []
-
-    # Identify date columns
-    date_cols = {}
-    for col in df.columns:
-        for row in df[col]:
-            d = extract_date(row)
-            if d:
-                date_cols[col] = d
-                break
-
-    # Parse wedge rows
-    for i in range(len(df)):
-        row = df.iloc[i]
-        wedge = row[0]
-
-        if not is_wedge_row(wedge):
-            continue
-
-        for col, date in date_cols.items():
-            common = row[col]
-            if isinstance(common, str) and common.strip() != "":
-                status = row[col + 1] if (col + 1) in df.columns else ""
-                rows.append({
-                    "OBSERVATIONDATETIME": date,
-                    "LOCATION": "Garden",
-                    "WEDGE": int(wedge),
-                    "CATEGORY": "Plant",
-                    "COMMONNAME": common.strip(),
-                    "SCIENTIFICNAME": scientific_name(common),
-                    "STATUS": status if isinstance(status, str) else "",
-                    "NOTES": ""
-                })
-
-    return pd.DataFrame(rows)
+    return parse_garden_sheet(pd.read_excel(filepath, header=None))
+
+def parse_garden_sheet(df):
+    date_cols = find_date_columns(df)
+    if not date_cols:
+        return pd.DataFrame()
+
+    # Wedge rows x date columns, flattened row-major; status sits one column right of each name
+    wedge_rows = df[is_wedge_row(df[0])]
+    cols = list(date_cols)
+    status_cols = df.reindex(columns=[c + 1 for c in cols]).loc[wedge_rows.index]
+    long = pd.DataFrame({
+        "wedge": np.repeat(wedge_rows[0].to_numpy(), len(cols)),
+        "col": np.tile(cols, len(wedge_rows)),
+        "common": wedge_rows[cols].to_numpy(dtype=object).ravel(),
+        "status": status_cols.to_numpy(dtype=object).ravel()
+    })
+    long = long[nonblank_strings(long["common"])]
+    if long.empty:
+        return pd.DataFrame()
+
+    common = long["common"].astype(str)
+    status = long["status"].where(is_instance(cell_types(long["status"].to_numpy()), str), "")
+    return pd.DataFrame({
+        "OBSERVATIONDATETIME": long["col"].map(date_cols).to_numpy(),
+        "LOCATION": "Garden",
+        "WEDGE": long["wedge"].astype(int).to_numpy(),
+        "CATEGORY": "Plant",
+        "COMMONNAME": common.str.strip().to_numpy(),
+        "SCIENTIFICNAME": scientific_names(common).to_numpy(),
+        "STATUS": status.to_numpy(),
+        "NOTES": ""
+    })
 
 ###############################################################################
 # PARSE A SANCTUARY FILE
 ###############################################################################
 
 def parse_sanctuary(filepath):
-    df = pd.read_excel(filepath, header=None)
-    rows = []
-
-    # Identify date columns
-    date_cols = {}
-    for col in df.columns:
-        for row in df[col]:
-            d = extract_date(row)
-            if d:
-                date_cols[col] = d
-                break
-
-    # Sanctuary bloom lists
-    for col, date in date_cols.items():
-        for i in range(len(df)):
-            cell = df.iloc[i, col]
-            if isinstance(cell, str) and cell.strip() != "":
-                rows.append({
-                    "OBSERVATIONDATETIME": date,
-                    "LOCATION": "Sanctuary",
-                    "WEDGE": "",
-                    "CATEGORY": "Plant",
-                    "COMMONNAME": cell.strip(),
-                    "SCIENTIFICNAME": scientific_name(cell),
-                    "STATUS": "Blooming",
-                    "NOTES": ""
-                })
-
-    return pd.DataFrame(rows)
+    return parse_sanctuary_sheet(pd.read_excel(filepath, header=None))
+
+def parse_sanctuary_sheet(df):
+    date_cols = find_date_columns(df)
+    if not date_cols:
+        return pd.DataFrame()
+
+    # Sanctuary bloom lists: every non-blank string under a date column, column by column
+    cols = list(date_cols)
+    long = pd.DataFrame({
+        "col": np.repeat(cols, len(df)),
+        "cell": df[cols].to_numpy(dtype=object).T.ravel()
+    })
+    long = long[nonblank_strings(long["cell"])]
+    if long.empty:
+        return pd.DataFrame()
+
+    cell = long["cell"].astype(str)
+    return pd.DataFrame({
+        "OBSERVATIONDATETIME": long["col"].map(date_cols).to_numpy(),
+        "LOCATION": "Sanctuary",
+        "WEDGE": "",
+        "CATEGORY": "Plant",
+        "COMMONNAME": cell.str.strip().to_numpy(),
+        "SCIENTIFICNAME": scientific_names(cell).to_numpy(),
+        "STATUS": "Blooming",
+        "NOTES": ""
+    })
+
+@timing.timed("build.parse_workbook")
+def parse_workbook(filepath):
+    if "sanctuary" in filepath.lower():
+        return parse_sanctuary(filepath)
+    return parse_garden(filepath)
 
 ###############################################################################
-# MAIN MERGE
+# PARSED-ROW CACHE
 ###############################################################################
 
-def main():
-    all_rows = []
-
-    for file in sorted(os.listdir(".")):
-        if not file.lower().endswith(".xlsx"):
-            continue
-
-        if "sanctuary" in file.lower():
-            df = parse_sanctuary(file)
-        else:
-            df = parse_garden(file)
+def file_digest(filepath):
+    digest = hashlib.sha256(PARSER_VERSION.encode())
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_path(digest):
+    return os.path.join(CACHE_DIR, f"{digest}.pkl")
+
+def load_cached(digest):
+    try:
+        return pd.read_pickle(cache_path(digest))
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+def store_cached(digest, df):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = cache_path(digest) + ".tmp"
+    df.to_pickle(tmp)
+    os.replace(tmp, cache_path(digest))
+
+def prune_cache(keep):
+    """Drop cache entries for workbooks that were edited or removed."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".pkl") and name[:-4] not in keep:
+            os.remove(os.path.join(CACHE_DIR, name))
+
+def parse_all(files, digests):
+    """Parsed rows per workbook: cached ones loaded, changed or new ones parsed in a process pool."""
+    parsed = {file: load_cached(digests[file]) for file in files}
+    todo = [file for file in files if parsed[file] is None]
+    if len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(todo), os.cpu_count() or 1)) as pool:
+            results = pool.map(parse_workbook, todo)
+            parsed.update(zip(todo, results))
+    elif todo:
+        parsed[todo[0]] = parse_workbook(todo[0])
+    for file in todo:
+        store_cached(digests[file], parsed[file])
+    print(f"Parsed {len(todo)} workbook(s), {len(files) - len(todo)} unchanged from cache")
+    return parsed
 
-        all_rows.append(df)
-
-    final = pd.concat(all_rows, ignore_index=True)
-
-    # Sort chronologically
-    final = final.sort_values(by="OBSERVATIONDATETIME")
-
-    # Ensure all columns exist
-    for col in COLUMNS:
-        if col not in final.columns:
-            final[col] = ""
+###############################################################################
+# MAIN MERGE
+###############################################################################
 
-    final = final[COLUMNS]
+def main():
+    timing.begin_run("build_csv")
+    # "~$" files are Excel's lock files for workbooks open in Excel
+    files = [
+        file for file in sorted(os.listdir("."))
+        if file.lower().endswith(".xlsx") and not file.startswith("~$")
+    ]
+    digests = {file: file_digest(file) for file in files}
+    with timing.stage("build.parse_all", rows_in=len(files)) as t:
+        parsed = parse_all(files, digests)
+        t["rows_out"] = sum(len(df) for df in parsed.values())
+    prune_cache(set(digests.values()))
+
+    all_rows = [parsed[file] for file in files]
+
+    with timing.stage("build.merge") as t:
+        final = pd.concat(all_rows, ignore_index=True)
+
+        # Sort chronologically
+        final = final.sort_values(by="OBSERVATIONDATETIME", kind="mergesort")
+
+        # Ensure all columns exist
+        for col in COLUMNS:
+            if col not in final.columns:
+                final[col] = ""
+
+        final = final[COLUMNS]
+        t["rows_out"] = len(final)
 
     # Output CSV
-    final.to_csv(OUTPUT_FILE, index=False, encoding="utf-8", line_terminator="\n")
+    with timing.stage("build.write_csv", rows_in=len(final)):
+        final.to_csv(OUTPUT_FILE, index=False, encoding="utf-8", lineterminator="\n")
 
     print("DONE — CSV generated:", OUTPUT_FILE)
 
+    if not os.path.exists(DASHBOARD_FILE):
+        print("Dashboard file not found, nothing to precompute:", DASHBOARD_FILE)
+        return
+    # Keyed on the dashboard's file as it is now, with its own reader, so the page finds them current
+    dashboard = shared_data.read_pheno(DASHBOARD_FILE)
+    with timing.stage("build.rollups", rows_in=len(dashboard)):
+        rollups.update_pheno(dashboard, DASHBOARD_FILE, ROLLUP_DIR)
+
+    with timing.stage("build.publish_shared", rows_in=len(dashboard)):
+        shared_data.publish_pheno(DASHBOARD_FILE, "\t", SHARED_DIR, CLIMATE_FILE)
+    print("Dashboard rollups and shared dataset up to date:", DASHBOARD_FILE)
+
 ###############################################################################
 
 if __name__ == "__main__":
@@ -1,4 +1,7 @@
 import streamlit as st
+import pandas as pd
+import timing
+import warmup
 
 # MUST be the first Streamlit command
 st.set_page_config(
@@ -19,6 +22,9 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# Load every dashboard's data on a background thread at server start (once per process)
+warmup.start()
+
 st.sidebar.title("NatureNotes 🌿")
 
 page = st.sidebar.radio(
@@ -26,18 +32,43 @@ page = st.sidebar.radio(
     ["eBird Dashboard", "Butterfly Dashboard", "Phenology Dashboard"]
 )
 
+if not warmup.done():
+    st.sidebar.caption("Loading data in the background: " + ", ".join(
+        f"{task['label']} {'✓' if task['status'] == warmup.READY else '…'}"
+        for task in warmup.status().values()
+    ))
+
+# Stage timings for this script run; the panel is filled in once the page has run
+timing.begin_run(page)
+show_timings = st.sidebar.checkbox("⏱️ Show stage timings")
+timing_panel = st.sidebar.empty()
+
 # -------------------------
 # PAGE ROUTING
 # -------------------------
 # We import inside the IF blocks to prevent the "disappearing" error
-if page == "eBird Dashboard":
-    from pages import _1_eBird_Dashboard as ebird
-    ebird.main()
+with timing.stage("app.page"):
+    if page == "eBird Dashboard":
+        from pages import _1_eBird_Dashboard as ebird
+        ebird.main()
+
+    elif page == "Butterfly Dashboard":
+        from pages import _2_Butterfly_Dashboard as butterfly
+        butterfly.main()
 
-elif page == "Butterfly Dashboard":
-    from pages import _2_Butterfly_Dashboard as butterfly
-    butterfly.main()
+    elif page == "Phenology Dashboard":
+        from pages import _3_Phenology_Dashboard as phenology
+        phenology.main()
 
-elif page == "Phenology Dashboard":
-    from pages import _3_Phenology_Dashboard as phenology
-    phenology.main()
+if show_timings:
+    records = pd.DataFrame(timing.run_records())
+    with timing_panel.container():
+        if records.empty:
+            st.caption("No stages recorded in this run.")
+        else:
+            st.dataframe(
+                records[["stage", "seconds", "rows_in", "rows_out", "cache", "rss_delta_mb", "error"]],
+                hide_index=True, use_container_width=True
+            )
+            if timing.LOG_FILE:
+                st.caption(f"Also appended to {timing.LOG_FILE}")
@@ -0,0 +1,429 @@
+"""
+Offline benchmark suite for the dashboard data paths.
+
+Generates synthetic inputs in the real layouts (eBird CSV exports, the
+phenology long-format TSV, garden and sanctuary workbooks) at each requested
+size, times load, clean, filter, compare and rebuild on them, and writes the
+results as JSON so runs from different commits can be compared:
+
+    python benchmark.py --rows 10000,100000 --output before.json
+    python benchmark.py --rows 10000,100000 --compare before.json
+
+Everything runs in a temporary directory against the same functions the
+pages call (their cached loaders are called uncached); nothing touches the
+network or the repo's own data files. The ingest.* and weather_panel.*
+benchmarks talk HTTP to stub_server.py, or with --transport replay only to
+recorded fixtures (record them with --transport record):
+
+    python benchmark.py --only ingest --only weather_panel --transport record --fixtures fixtures/http
+    python benchmark.py --only ingest --only weather_panel --transport replay --fixtures fixtures/http
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+# Keep the stage log out of the timings (and the benchmark runs out of the log)
+os.environ.setdefault("TIMING_LOG", "")
+
+import ebird_store
+import http_transport
+import pheno_cube
+import rollups
+import shared_data
+import stub_server
+import update_data
+import weather
+
+# === Constants ===
+DEFAULT_ROWS = [10_000, 100_000]
+DEFAULT_OUTPUT = "benchmark_results.json"
+SEED = 1985
+# Workbooks are hand-kept spreadsheets; past this they stop resembling the real ones
+WORKBOOK_MAX_ROWS = 50_000
+WORKBOOK_DATES = 12
+# Flag a benchmark in --compare when it got this much slower
+REGRESSION_RATIO = 1.2
+# Fetched by the ingest benchmark; just after the synthetic history ends, and fixed so fixtures replay
+INGEST_WINDOW = (date(2025, 1, 1), date(2025, 3, 31))
+# What ingest writes; restored before each ingest sample
+INGEST_STATE = ["ebird", "rollups", "shared"]
+STUB_LATENCY = 0.02
+STUB_ERROR_RATE = 0.02
+STUB_SPECIES_PER_DAY = 40
+
+EBIRD_HEADER = [
+    "GLOBAL UNIQUE IDENTIFIER", "COMMON NAME", "SCIENTIFIC NAME", "OBSERVATION COUNT", "LOCALITY ID",
+    "OBSERVATION DATE", "TIME OBSERVATIONS STARTED", "OBSERVER ID", "OBSERVATION TYPE", "DURATION MINUTES",
+    "NUMBER OBSERVERS", "ALL SPECIES REPORTED", "SPECIES COMMENTS"
+]
+PHENO_HEADER = ["OBSERVATIONDATETIME", "LOCATION", "WEDGE", "CATEGORY", "COMMONNAME", "SCIENTIFICNAME", "STATUS", "NOTES"]
+PHENO_CATEGORIES = ["Plant", "Insect", "Bird", "Mammal", "Reptile", "Fungus"]
+PHENO_STATUSES = ["Blooming", "New growth", "Winter mode", "Seeding", "Dormant", "Fruiting"]
+
+# === Synthetic data ===
+def species_pool(n, kind):
+    common = [f"Synthetic {kind} {i:04d}" for i in range(n)]
+    scientific = [f"Genus{i // 7:03d} species{i:04d}" for i in range(n)]
+    return common, scientific
+
+def from_codes(codes, categories):
+    """A categorical column: cheap to build at 10M rows and written out as plain strings."""
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+def date_strings(start, days):
+    """M/D/YYYY strings for consecutive days from start, as in the exports."""
+    dates = pd.date_range(start, periods=days, freq="D")
+    return [f"{d.month}/{d.day}/{d.year}" for d in dates]
+
+def synthetic_ebird(path, rows, rng):
+    """An eBird 'My eBird Data' style export with the historical_checklists.csv columns."""
+    common, scientific = species_pool(450, "Bird")
+    days = date_strings("1985-01-01", 40 * 365)
+    species = rng.integers(0, len(common), rows)
+    # Exports come out roughly chronological
+    day = np.sort(rng.integers(0, len(days), rows))
+    counts = [str(i) for i in range(1, 60)] + ["X"]
+    count = np.where(rng.random(rows) < 0.1, len(counts) - 1, rng.integers(0, len(counts) - 1, rows))
+    times = [f"{h:02d}:{m:02d}" for h in range(6, 12) for m in (0, 15, 30, 45)] + [""]
+    pd.DataFrame({
+        "GLOBAL UNIQUE IDENTIFIER": "URN:CornellLabOfOrnithology:EBIRD:OBS" + pd.Series(np.arange(rows) + 10**8).astype(str),
+        "COMMON NAME": from_codes(species, common),
+        "SCIENTIFIC NAME": from_codes(species, scientific),
+        "OBSERVATION COUNT": from_codes(count, counts),
+        "LOCALITY ID": from_codes(rng.integers(0, len(ebird_store.HEADWATERS_LOCATIONS), rows), ebird_store.HEADWATERS_LOCATIONS),
+        "OBSERVATION DATE": from_codes(day, days),
+        "TIME OBSERVATIONS STARTED": from_codes(rng.integers(0, len(times), rows), times),
+        "OBSERVER ID": "obsr197741",
+        "OBSERVATION TYPE": "Traveling",
+        "DURATION MINUTES": 60,
+        "NUMBER OBSERVERS": 1,
+        "ALL SPECIES REPORTED": 1,
+        "SPECIES COMMENTS": ""
+    }, columns=EBIRD_HEADER).to_csv(path, index=False)
+
+def synthetic_pheno(path, rows, rng):
+    """A tab-separated long-format file like historical_pheno_data.csv."""
+    common, scientific = species_pool(300, "Plant")
+    # Surveys are roughly monthly; bigger files get more survey days
+    days = date_strings("2023-01-01", 3 * 365)
+    survey_days = np.sort(rng.choice(len(days), size=min(len(days), max(24, rows // 500)), replace=False))
+    species = rng.integers(0, len(common), rows)
+    location = rng.integers(0, 2, rows)
+    wedges = [str(i) for i in range(1, 13)] + [""]
+    pd.DataFrame({
+        "OBSERVATIONDATETIME": from_codes(np.sort(rng.choice(survey_days, rows)), days),
+        "LOCATION": from_codes(location, ["Garden", "Sanctuary"]),
+        # Only garden rows have a wedge
+        "WEDGE": from_codes(np.where(location == 0, rng.integers(0, 12, rows), 12), wedges),
+        "CATEGORY": from_codes(rng.integers(0, len(PHENO_CATEGORIES), rows), PHENO_CATEGORIES),
+        "COMMONNAME": from_codes(species, common),
+        "SCIENTIFICNAME": from_codes(species, scientific),
+        "STATUS": from_codes(rng.integers(0, len(PHENO_STATUSES), rows), PHENO_STATUSES),
+        "NOTES": ""
+    }, columns=PHENO_HEADER).to_csv(path, sep="\t", index=False)
+
+def workbook_dates(n):
+    return [pd.Timestamp("2024-01-26") + pd.Timedelta(days=28 * i) for i in range(n)]
+
+def synthetic_garden(path, rows, rng):
+    """A monthly garden record: wedge rows, one name/status column pair per survey date."""
+    common, _ = species_pool(300, "Plant")
+    wedge_rows = max(1, min(rows, WORKBOOK_MAX_ROWS) // WORKBOOK_DATES)
+    width = 2 + 2 * WORKBOOK_DATES
+    sheet = np.full((4 + wedge_rows, width), None, dtype=object)
+    sheet[0, 1] = "MONTHLY GARDEN RECORD - 2024"
+    sheet[1, 0] = "WEDGE"
+    for j, d in enumerate(workbook_dates(WORKBOOK_DATES)):
+        col = 2 + 2 * j
+        sheet[1, col] = f"{d:%b}. {d.day}, {d.year}"
+        sheet[2, col] = "Overcast mid 50s"
+        sheet[4:, col] = np.array(common, dtype=object)[rng.integers(0, len(common), wedge_rows)]
+        sheet[4:, col + 1] = np.array(PHENO_STATUSES, dtype=object)[rng.integers(0, len(PHENO_STATUSES), wedge_rows)]
+    sheet[4:, 0] = np.arange(wedge_rows) % 12 + 1
+    pd.DataFrame(sheet).to_excel(path, header=False, index=False)
+
+def synthetic_sanctuary(path, rows, rng):
+    """A sanctuary bloom list: a date per column with the plants in bloom listed under it."""
+    common, _ = species_pool(300, "Plant")
+    per_date = max(1, min(rows, WORKBOOK_MAX_ROWS) // WORKBOOK_DATES)
+    sheet = np.full((5 + per_date, WORKBOOK_DATES), None, dtype=object)
+    sheet[0, 0] = "HIW SANCTUARY PHENOLOGY 2024"
+    sheet[2, :] = "PLANTS IN BLOOM"
+    sheet[3, :] = [d.to_pydatetime() for d in workbook_dates(WORKBOOK_DATES)]
+    sheet[4, :] = "Sunny, breezy mid 70s"
+    sheet[5:, :] = np.array(common, dtype=object)[rng.integers(0, len(common), (per_date, WORKBOOK_DATES))]
+    pd.DataFrame(sheet).to_excel(path, header=False, index=False)
+
+# === Timing ===
+def time_call(fn, repeat, number=1, setup=None):
+    """Best-of style timings: `repeat` samples of `number` calls each, in seconds per call."""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    return samples
+
+def load_build_csv():
+    """.github/workflows/Pheno/build_csv.py is a script, not a package; load it by path."""
+    spec = importlib.util.spec_from_file_location("build_csv", ROOT / ".github" / "workflows" / "Pheno" / "build_csv.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def remove_store():
+    shutil.rmtree(ebird_store.STORE_DIR, ignore_errors=True)
+
+def remove_weather():
+    weather.DB_FILE.unlink(missing_ok=True)
+
+def snapshot_path(name):
+    return ebird_store.DATA_DIR / "_before_ingest" / name
+
+def snapshot_ingest_state():
+    for name in INGEST_STATE:
+        shutil.rmtree(snapshot_path(name), ignore_errors=True)
+        if (ebird_store.DATA_DIR / name).exists():
+            shutil.copytree(ebird_store.DATA_DIR / name, snapshot_path(name))
+
+def restore_ingest_state():
+    for name in INGEST_STATE:
+        shutil.rmtree(ebird_store.DATA_DIR / name, ignore_errors=True)
+        if snapshot_path(name).exists():
+            shutil.copytree(snapshot_path(name), ebird_store.DATA_DIR / name)
+
+def benchmarks():
+    """(name, fn, options) for one input size. Runs inside the working directory holding the inputs."""
+    from pages import _1_eBird_Dashboard as ebird_page
+    from pages import _3_Phenology_Dashboard as pheno_page
+    build_csv = load_build_csv()
+
+    # Bypass the Streamlit caches: time the loader bodies themselves
+    load_ebird = lambda: ebird_page.load_ebird_tables.__wrapped__(ebird_page.current_ebird_version())
+    load_pheno = lambda: pheno_page.load_pheno_data.__wrapped__(pheno_page.current_pheno_version())
+
+    ebird_csv = ebird_store.CSV_FILE
+    raw = pd.read_csv(ebird_csv, low_memory=False)
+    ebird_tables = load_ebird()
+    latest = ebird_tables.latest_date()
+
+    pheno_df, pheno_index, name_index = load_pheno()
+    dates = pheno_index.unique_dates()
+    cube = pheno_cube.DateCountCube(pheno_df, pheno_index)
+    cube.cumulative
+    locations = ["Garden"]
+    categories = PHENO_CATEGORIES[:3]
+    rng = np.random.default_rng(0)
+
+    def pheno_filter():
+        # The dashboard's filtered table, as the page runs it
+        return pheno_page.filter_observations(pheno_df, pheno_index, name_index, dates[0], dates[len(dates) // 2],
+                                              locations, categories, "plant 01")
+
+    # 1985-present at one row per day, as weather.py backfill writes it
+    days = pd.date_range(weather.CLIMATE_START, pd.Timestamp.today().normalize(), freq="D", name="Date")
+    climate = weather.climate_frame(pd.DataFrame({
+        "Date": days,
+        "temp_max": rng.normal(80, 10, len(days)),
+        "temp_min": rng.normal(60, 10, len(days)),
+        "precipitation": rng.exponential(0.1, len(days))
+    }))
+
+    def cube_build():
+        pheno_cube.DateCountCube(pheno_df, pheno_index).cumulative
+
+    # The history before the ingest window, with its rollups and shared dataset
+    rollups.update_ebird()
+    shared_data.publish_ebird()
+    snapshot_ingest_state()
+    ingest_rows = ((INGEST_WINDOW[1] - INGEST_WINDOW[0]).days + 1) * len(update_data.HEADWATERS_LOCATIONS) * STUB_SPECIES_PER_DAY
+
+    def ingest():
+        # update_data.py's path end to end: fetch, append, rollups, shared dataset
+        rows_before = ebird_store.read_meta()["rows"]
+        with contextlib.redirect_stdout(io.StringIO()):
+            writer, failed = update_data.ingest(*INGEST_WINDOW)
+        if failed:
+            print(f"    ingest: {len(failed)} chunk(s) failed")
+        # rows/s is reported over ingest_rows; say so when the store took a different number
+        appended = ebird_store.read_meta()["rows"] - rows_before
+        if appended != ingest_rows:
+            print(f"    ingest: appended {appended:,} rows, expected {ingest_rows:,}")
+
+    # The weather lookups the three pages make on first render (as warmup.warm_weather does)
+    survey_dates = dates[::max(1, len(dates) // 12)]
+    def weather_panels():
+        latest = INGEST_WINDOW[1]
+        weather.get_daily(*weather.CLIMATE_LOCATION, latest - timedelta(days=30), latest)
+        weather.get_dates(*weather.CLIMATE_LOCATION, survey_dates)
+        weather.get_daily(*weather.CLIMATE_LOCATION, dates[0], dates[-1])
+    panel_days = 31 + len(survey_dates) + (dates[-1] - dates[0]).days + 1
+
+    return [
+        ("ebird.read_csv", lambda: ebird_store.read_ebird_csv(ebird_csv), {}),
+        ("ebird.clean", lambda: ebird_store.clean_ebird_data(raw), {}),
+        ("ebird.load_cold", load_ebird, {"setup": remove_store}),
+        ("ebird.load_warm", load_ebird, {}),
+        ("ebird.filter_range", lambda: ebird_tables.frame(ebird_tables.date_range(latest - pd.Timedelta(days=30), latest),
+                                                          ebird_store.DASHBOARD_COLUMNS), {"number": 100}),
+        ("ebird.checklist_metrics", ebird_tables.checklist_metrics, {"number": 20}),
+        ("ebird.species_totals", lambda: ebird_tables.species_totals(ebird_tables.date_range(latest - pd.Timedelta(days=365), latest)),
+         {"number": 20}),
+        ("shared.publish_ebird", lambda: shared_data.publish("ebird", ebird_tables.tables()), {}),
+        ("shared.read_ebird", shared_data.read_ebird, {"number": 20}),
+        ("pheno.read_csv", lambda: shared_data.read_pheno(pheno_page.PHENO_DATA_FILE), {}),
+        ("pheno.load", load_pheno, {}),
+        ("shared.publish_pheno", lambda: shared_data.publish("pheno", pheno_df), {}),
+        ("shared.frame_pheno", lambda: shared_data.frame("pheno"), {"number": 20}),
+        ("pheno.filter", pheno_filter, {"number": 20}),
+        ("weather.attach", lambda: weather.attach(pheno_df, climate), {"number": 20}),
+        ("pheno.cube_build", cube_build, {}),
+        ("pheno.compare_dates", lambda: cube.compare(dates[0], dates[-1], locations, categories), {"number": 100}),
+        ("pheno.compare_ranges", lambda: cube.compare_ranges((dates[0], dates[len(dates) // 2]), (dates[len(dates) // 2], dates[-1]),
+                                                             locations, categories), {"number": 100}),
+        ("ingest.update", ingest, {"setup": restore_ingest_state, "rows": ingest_rows}),
+        ("weather_panel.cold", weather_panels, {"setup": remove_weather, "rows": panel_days}),
+        ("weather_panel.warm", weather_panels, {"number": 5, "rows": panel_days}),
+        ("rebuild.parse_garden", lambda: build_csv.parse_garden("garden.xlsx"), {}),
+        ("rebuild.parse_sanctuary", lambda: build_csv.parse_sanctuary("sanctuary.xlsx"), {})
+    ]
+
+def run_size(rows, repeat, only, seed):
+    rng = np.random.default_rng(seed)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="naturenotes-bench-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            started = time.perf_counter()
+            synthetic_ebird(ebird_store.CSV_FILE, rows, rng)
+            synthetic_pheno("historical_pheno_data.csv", rows, rng)
+            synthetic_garden("garden.xlsx", rows, rng)
+            synthetic_sanctuary("sanctuary.xlsx", rows, rng)
+            print(f"Generated {rows:,}-row inputs in {time.perf_counter() - started:.1f}s")
+
+            for name, fn, options in benchmarks():
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                samples = time_call(fn, repeat, options.get("number", 1), options.get("setup"))
+                # Workbook benchmarks are capped at WORKBOOK_MAX_ROWS; HTTP ones report the rows they fetch
+                effective_rows = min(rows, WORKBOOK_MAX_ROWS) if name.startswith("rebuild.") else options.get("rows", rows)
+                best = min(samples)
+                results.append({
+                    "benchmark": name,
+                    "rows": effective_rows,
+                    "size": rows,
+                    "repeat": repeat,
+                    "number": options.get("number", 1),
+                    "seconds": samples,
+                    "best": best,
+                    "median": statistics.median(samples),
+                    "rows_per_second": effective_rows / best if best else None
+                })
+                print(f"  {name:<24} {effective_rows:>11,} rows  best {best * 1000:10.3f} ms  median {statistics.median(samples) * 1000:10.3f} ms"
+                      f"  {effective_rows / best if best else 0:12,.0f} rows/s")
+        finally:
+            os.chdir(cwd)
+    return results
+
+@contextlib.contextmanager
+def http_endpoints(transport, latency, error_rate, seed):
+    """Point the fetchers at a stub_server.py for the run; replay needs no server."""
+    if transport == "replay":
+        yield
+        return
+    server, base_url = stub_server.serve(latency=latency, error_rate=error_rate, species_per_day=STUB_SPECIES_PER_DAY, seed=seed)
+    try:
+        with stub_server.pointed_at(base_url):
+            yield
+    finally:
+        server.shutdown()
+
+# === Results ===
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+def environment(seed):
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "seed": seed
+    }
+
+def compare(results, baseline_path):
+    """Print current vs baseline best times per (benchmark, size) and flag regressions."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    before = {(r["benchmark"], r["size"]): r["best"] for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} (commit {baseline['environment']['commit']}):")
+    regressions = 0
+    for r in results:
+        old = before.get((r["benchmark"], r["size"]))
+        if not old:
+            continue
+        ratio = r["best"] / old
+        flag = "  SLOWER" if ratio > REGRESSION_RATIO else ""
+        regressions += bool(flag)
+        print(f"  {r['benchmark']:<24} {r['size']:>11,} rows  {old * 1000:10.3f} -> {r['best'] * 1000:10.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the dashboard data paths")
+    parser.add_argument("--rows", default=",".join(str(n) for n in DEFAULT_ROWS),
+                        help="comma-separated input sizes, e.g. 10000,1000000,10000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", action="append", help="run only benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="BASELINE", help="a previous results file to compare against")
+    parser.add_argument("--transport", choices=["stub", "record", "replay"], default="stub",
+                        help="HTTP for ingest/weather_panel: the local stub, the stub while recording fixtures, or the fixtures alone")
+    parser.add_argument("--fixtures", default=http_transport.DEFAULT_FIXTURE_DIR, help="fixture directory for record / replay")
+    parser.add_argument("--stub-latency", type=float, default=STUB_LATENCY, help="seconds before each stub response")
+    parser.add_argument("--stub-error-rate", type=float, default=STUB_ERROR_RATE, help="share of stub responses that are 429/5xx")
+    args = parser.parse_args()
+
+    os.environ["NATURENOTES_HTTP"] = "live" if args.transport == "stub" else args.transport
+    # Absolute, since the benchmarks run in a temporary directory
+    os.environ["NATURENOTES_FIXTURES"] = str(Path(args.fixtures).resolve())
+    results = []
+    with http_endpoints(args.transport, args.stub_latency, args.stub_error_rate, args.seed):
+        for rows in (int(n) for n in args.rows.split(",")):
+            results.extend(run_size(rows, args.repeat, args.only, args.seed))
+
+    env = {**environment(args.seed), "transport": args.transport, "stub_latency": args.stub_latency, "stub_error_rate": args.stub_error_rate}
+    Path(args.output).write_text(json.dumps({"environment": env, "results": results}, indent=2))
+    print(f"Results written to {args.output}")
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
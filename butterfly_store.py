@@ -0,0 +1,124 @@
+"""
+Typed, multi-season store for the butterfly survey counts.
+
+Every consolidated survey CSV (san_antonio_butterfly_counts_consolidated_*.csv,
+one per season) is read into one long frame, and a species x survey-date
+count matrix is built from it once per data load. The checklist, its summary
+metrics, the per-survey totals and comparisons across any set of surveys are
+slices of that matrix.
+"""
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# === Constants ===
+SOURCE_GLOB = "san_antonio_butterfly_counts_consolidated_*.csv"
+COLUMNS = ["DATE", "COMMON NAME", "SCIENTIFIC NAME", "COUNT"]
+SPECIES_KEYS = ["COMMON NAME", "SCIENTIFIC NAME"]
+
+def source_files(directory="."):
+    return sorted(Path(directory).glob(SOURCE_GLOB))
+
+def source_signature(directory="."):
+    """(name, size, mtime) of every source CSV, so a cache keyed on it sees new or edited seasons."""
+    return tuple((path.name, path.stat().st_size, path.stat().st_mtime_ns) for path in source_files(directory))
+
+def read_survey_csv(path):
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip().str.upper()
+    missing = [c for c in COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"{Path(path).name} is missing columns: {missing}")
+    df = df[COLUMNS].copy()
+    df["DATE"] = pd.to_datetime(df["DATE"], errors="coerce")
+    df["COUNT"] = pd.to_numeric(df["COUNT"], errors="coerce").fillna(0).astype("int32")
+    for col in SPECIES_KEYS:
+        df[col] = df[col].astype("string").str.strip()
+    return df.dropna(subset=["DATE", "COMMON NAME"])
+
+def load_surveys(paths=None):
+    """All survey rows across seasons, with categorical species names."""
+    paths = source_files() if paths is None else paths
+    if not paths:
+        raise FileNotFoundError(f"No butterfly survey files matching {SOURCE_GLOB}")
+    df = pd.concat([read_survey_csv(path) for path in paths], ignore_index=True)
+    df["SCIENTIFIC NAME"] = df["SCIENTIFIC NAME"].fillna("")
+    for col in SPECIES_KEYS:
+        df[col] = df[col].astype("category")
+    return df.sort_values("DATE", kind="mergesort").reset_index(drop=True)
+
+class SurveyMatrix:
+    """
+    counts[i, j] = individuals of species i recorded on survey date j.
+    Species are (common name, scientific name) pairs; repeated rows for the
+    same species and survey are summed.
+    """
+    def __init__(self, df):
+        species_codes = np.column_stack([df[col].cat.codes.to_numpy() for col in SPECIES_KEYS]).astype(np.int64)
+        species, species_of_row = np.unique(species_codes, axis=0, return_inverse=True)
+        days = df["DATE"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        self.dates, date_of_row = np.unique(days, return_inverse=True)
+
+        self.species = pd.DataFrame({
+            col: pd.Categorical.from_codes(species[:, i], categories=df[col].cat.categories)
+            for i, col in enumerate(SPECIES_KEYS)
+        })
+        self.counts = np.zeros((len(species), len(self.dates)), dtype=np.int64)
+        np.add.at(self.counts, (species_of_row.reshape(-1), date_of_row.reshape(-1)), df["COUNT"].to_numpy())
+
+    def survey_dates(self):
+        """Survey dates as Python dates, ascending."""
+        return self.dates.tolist()
+
+    def column(self, survey_date):
+        """Matrix column of a survey date."""
+        day = np.datetime64(pd.Timestamp(survey_date).date(), "D")
+        pos = np.searchsorted(self.dates, day)
+        if pos == len(self.dates) or self.dates[pos] != day:
+            raise KeyError(f"No survey on {survey_date}")
+        return int(pos)
+
+    def checklist(self, survey_date):
+        """Species recorded on one survey with their counts, most numerous first."""
+        counts = self.counts[:, self.column(survey_date)]
+        seen = np.flatnonzero(counts)
+        result = self.species.iloc[seen].assign(COUNT=counts[seen])
+        return result.sort_values("COUNT", ascending=False, kind="mergesort").reset_index(drop=True)
+
+    def summary(self, survey_date):
+        """(species found, total individuals, most observed species) for one survey."""
+        counts = self.counts[:, self.column(survey_date)]
+        if not counts.any():
+            return 0, 0, "N/A"
+        # Species recorded under several scientific names are totalled by common name
+        by_name = pd.Series(counts).groupby(self.species["COMMON NAME"].to_numpy()).sum()
+        by_name = by_name[by_name > 0]
+        return len(by_name), int(counts.sum()), by_name.idxmax()
+
+    def totals(self):
+        """Per survey: Date, Species Found (distinct common names counted) and Individuals, in date order."""
+        # Species recorded under several scientific names count once, as in summary()
+        names = self.species["COMMON NAME"].cat.codes.to_numpy()
+        by_name = np.zeros((len(self.species["COMMON NAME"].cat.categories), len(self.dates)), dtype=np.int64)
+        np.add.at(by_name, names, self.counts)
+        return pd.DataFrame({
+            "Date": pd.to_datetime(self.dates).astype("datetime64[ns]"),
+            "Species Found": (by_name > 0).sum(axis=0),
+            "Individuals": self.counts.sum(axis=0)
+        })
+
+    def compare(self, survey_dates):
+        """
+        One count column per survey (in date order) for every species seen in
+        any of them, plus the change from the first survey to the last.
+        """
+        survey_dates = sorted(survey_dates)
+        columns = [self.column(d) for d in survey_dates]
+        counts = self.counts[:, columns]
+        seen = np.flatnonzero(counts.any(axis=1))
+        result = self.species.iloc[seen].reset_index(drop=True)
+        for d, values in zip(survey_dates, counts[seen].T):
+            result[f"Count ({d})"] = values
+        if len(columns) >= 2:
+            result["Difference"] = counts[seen, -1] - counts[seen, 0]
+        return result
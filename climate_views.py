@@ -0,0 +1,53 @@
+"""
+Weather-vs-abundance charts for the dashboards.
+
+Each page passes one row per sampling event (checklist, survey or survey
+day) carrying an abundance measure and the weather.ATTACHED_COLUMNS joined
+on at ingest. Everything is read from the local climate table, so these
+views work offline and never wait on Open-Meteo.
+"""
+import altair as alt
+import pandas as pd
+import streamlit as st
+import weather
+
+# === Constants ===
+MEASURES = {
+    "temp_max": "Max temp (°F)",
+    "temp_min": "Min temp (°F)",
+    "precipitation": "Rain that day (in)",
+    "precipitation_7d": "Rain over the past 7 days (in)"
+}
+BINS = 10
+
+def binned_means(df, x, y, bins=BINS):
+    """Mean of y (and the number of events) in equal-width bins of x, labelled by bin midpoint."""
+    binned = pd.cut(df[x], bins=bins)
+    means = df.groupby(binned, observed=True)[y].agg(["mean", "size"]).reset_index()
+    means[x] = means[x].map(lambda interval: interval.mid).astype(float)
+    return means.rename(columns={"mean": y, "size": "Events"})
+
+def weather_vs_abundance(df, value, key, event="checklist"):
+    """
+    Scatter of `value` against a chosen weather measure, with the mean per
+    weather bin and a rank correlation. Rows without weather are left out.
+    """
+    measure = st.selectbox("Weather measure", list(MEASURES), format_func=MEASURES.get, key=f"{key}_measure")
+    data = df[[measure, value]].dropna()
+    if data.empty:
+        st.info("No climate data covers these dates yet; run `python weather.py backfill` to build it.")
+        return
+    # Spearman's rho as the Pearson correlation of ranks (Series.corr's "spearman" needs scipy)
+    rho = data[measure].rank().corr(data[value].rank())
+    st.caption(f"{len(data):,} of {len(df):,} {event}s have weather. Rank correlation: {rho:+.2f}"
+               if pd.notna(rho) else f"{len(data):,} of {len(df):,} {event}s have weather.")
+    points = alt.Chart(data).mark_circle(opacity=0.35).encode(
+        x=alt.X(f"{measure}:Q", title=MEASURES[measure]),
+        y=alt.Y(f"{value}:Q", title=value)
+    )
+    means = alt.Chart(binned_means(data, measure, value)).mark_line(point=True, color="firebrick").encode(
+        x=f"{measure}:Q",
+        y=f"{value}:Q",
+        tooltip=[alt.Tooltip(f"{measure}:Q", format=".1f"), alt.Tooltip(f"{value}:Q", format=".2f"), "Events:Q"]
+    )
+    st.altair_chart(points + means, use_container_width=True)
@@ -0,0 +1,96 @@
+"""
+Precomputed lookup structures for the dashboard frames.
+
+The loaders keep each dataset sorted by date and build these once per data
+load, so a Streamlit rerun slices instead of scanning the whole frame.
+"""
+import numpy as np
+import pandas as pd
+
+def sort_by_date(df, column="Date"):
+    """Stable sort by date with a fresh RangeIndex, so positions line up with a DateIndex."""
+    return df.sort_values(column, kind="mergesort").reset_index(drop=True)
+
+def day_number(value):
+    """Days since the epoch for any date-like value."""
+    return int(np.datetime64(pd.Timestamp(value).date(), "D").astype(np.int64))
+
+class DateIndex:
+    """
+    Integer day offsets (days since the epoch) of a date-sorted frame.
+    Date-range and single-date lookups are binary searches returning
+    positional slices into that frame.
+    """
+    def __init__(self, dates):
+        self.days = dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+        if len(self.days) and np.any(np.diff(self.days) < 0):
+            raise ValueError("DateIndex needs a frame sorted by date; use sort_by_date first.")
+
+    def __len__(self):
+        return len(self.days)
+
+    def range(self, start, end):
+        """Positional slice of rows dated start..end, both inclusive."""
+        lo = np.searchsorted(self.days, day_number(start), side="left")
+        hi = np.searchsorted(self.days, day_number(end), side="right")
+        return slice(int(lo), int(max(lo, hi)))
+
+    def day(self, value):
+        """Positional slice of rows dated on one day."""
+        return self.range(value, value)
+
+    def unique_days(self):
+        """The distinct day numbers present, ascending."""
+        return np.unique(self.days)
+
+    def unique_dates(self):
+        """The distinct dates present as Python dates, ascending."""
+        return self.unique_days().astype("datetime64[D]").tolist()
+
+def code_mask(series, selected):
+    """
+    Boolean mask of rows whose categorical value is in `selected`.
+    Works on the integer category codes: one small lookup table, one gather.
+    """
+    wanted = series.cat.categories.get_indexer(pd.Index(list(selected)))
+    return codes_mask(series, wanted[wanted >= 0])
+
+def codes_mask(series, codes):
+    """Boolean mask of rows whose categorical code is in `codes`."""
+    table = np.zeros(len(series.cat.categories) + 1, dtype=bool)
+    table[np.asarray(codes, dtype=np.int64)] = True
+    # Missing values have code -1, which lands on the trailing False slot
+    return table[series.cat.codes.to_numpy()]
+
+class NameSearchIndex:
+    """
+    Case-insensitive substring search over the distinct values of a
+    categorical column. Built once per data load from the categories (a few
+    hundred names), not the rows: a trigram table narrows a query to the
+    names sharing all its trigrams, and only those few are checked.
+    Results are category codes, which codes_mask turns into a row filter.
+    """
+    def __init__(self, series):
+        self.names = [str(name).lower() for name in series.cat.categories]
+        postings = {}
+        for code, name in enumerate(self.names):
+            for gram in self.trigrams(name):
+                postings.setdefault(gram, set()).add(code)
+        self.postings = postings
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def search(self, query):
+        """Codes of names containing query (a literal substring, any case), ascending."""
+        query = query.lower()
+        if not query:
+            return np.arange(len(self.names))
+        grams = self.trigrams(query)
+        if grams:
+            candidates = set.intersection(*(self.postings.get(gram, set()) for gram in grams))
+        else:
+            # One or two characters: too short for trigrams, and the name list is small
+            candidates = range(len(self.names))
+        return np.array(sorted(code for code in candidates if query in self.names[code]), dtype=np.int64)
@@ -0,0 +1,176 @@
+"""
+Normalized eBird data model: checklists, observations and a taxonomy lookup.
+
+The store (like every export) repeats a checklist's location, observer,
+date, start time and effort on each species row. Here each sampling event
+is one row of `checklists`, each taxon one row of `taxonomy`, and
+`observations` holds only integer checklist and taxon IDs next to the count.
+Checklist IDs follow date order, so a date range is a binary search over the
+checklists and then over the observations, and per-checklist metrics
+(species per checklist, counts per hour of effort) are bincounts over
+integer IDs instead of string groupbys.
+
+Built once per data load and shared read-only across sessions; frame()
+joins the display columns back on for just the rows being shown. The three
+tables are what shared_data publishes, and from_tables() uses the mapped
+copies as they are, so the observations may be Arrow-backed.
+"""
+import numpy as np
+import pandas as pd
+import data_index
+import weather
+
+# === Constants ===
+# A checklist (sampling event) is one observer's visit to a location at a start time; see checklist_ids()
+CHECKLIST_COLUMNS = ["Location ID", "Date", "Time", "Observer ID"]
+EFFORT_COLUMNS = ["Protocol", "Duration Minutes", "Observers"]
+TAXON_COLUMNS = ["Species", "Scientific Name"]
+OBSERVATION_COLUMNS = ["Count", "Present"]
+# Observation columns as frame() returns them, whatever the table holds
+OBSERVATION_TYPES = {"Count": "Int32", "Present": bool}
+# Store columns the model is built from
+COLUMNS = CHECKLIST_COLUMNS + EFFORT_COLUMNS + TAXON_COLUMNS + OBSERVATION_COLUMNS
+
+def checklist_ids(df):
+    """
+    (ids, first): the checklist of each row of a store frame, numbered in date
+    order, and the position of each checklist's first row. Rows without a
+    start time or observer on a day and location count as one checklist;
+    rows of one visit with different effort are separate sampling events.
+    """
+    days = df["Date"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+    keys = [days] + [df[col].cat.codes.to_numpy().astype(np.int64) for col in CHECKLIST_COLUMNS + ["Protocol"] if col != "Date"]
+    keys += [df[col].fillna(-1).to_numpy(dtype=np.int64) for col in ["Duration Minutes", "Observers"]]
+    keys = np.column_stack(keys)
+    _, first, ids = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return ids.reshape(-1).astype(np.int32), first
+
+class EbirdTables:
+    def __init__(self, df):
+        ids, first = checklist_ids(df)
+        # Weather joined on at ingest is per day, so it belongs with the checklist
+        weather_columns = [col for col in weather.ATTACHED_COLUMNS if col in df.columns]
+        self.checklists = df.iloc[first][CHECKLIST_COLUMNS + EFFORT_COLUMNS + weather_columns].reset_index(drop=True)
+        self.checklists.index.name = "Checklist ID"
+
+        taxon_keys = np.column_stack([df[col].cat.codes.to_numpy().astype(np.int64) for col in TAXON_COLUMNS])
+        _, taxon_first, taxon_ids = np.unique(taxon_keys, axis=0, return_index=True, return_inverse=True)
+        self.taxonomy = df.iloc[taxon_first][TAXON_COLUMNS].reset_index(drop=True)
+        self.taxonomy.index.name = "Taxon ID"
+
+        order = np.argsort(ids, kind="stable")
+        self.observations = pd.DataFrame({
+            "Checklist ID": ids[order],
+            "Taxon ID": taxon_ids.reshape(-1)[order].astype(np.int32),
+            "Count": df["Count"].array.take(order),
+            "Present": df["Present"].to_numpy(dtype=bool)[order]
+        })
+        self.build_index()
+
+    @classmethod
+    def from_tables(cls, checklists, taxonomy, observations):
+        """The tables as tables() returned them (e.g. memory-mapped by shared_data), used without copying."""
+        self = cls.__new__(cls)
+        self.checklists, self.taxonomy, self.observations = checklists, taxonomy, observations
+        self.checklists.index.name = "Checklist ID"
+        self.taxonomy.index.name = "Taxon ID"
+        self.build_index()
+        return self
+
+    def build_index(self):
+        # Observations of checklist c are rows offsets[c]:offsets[c + 1]
+        self.offsets = np.searchsorted(self.observations["Checklist ID"].to_numpy(), np.arange(len(self.checklists) + 1))
+        self.date_index = data_index.DateIndex(self.checklists["Date"])
+
+    def tables(self):
+        """{"checklists", "taxonomy", "observations"}; row positions are the IDs."""
+        return {"checklists": self.checklists, "taxonomy": self.taxonomy, "observations": self.observations}
+
+    def __len__(self):
+        return len(self.observations)
+
+    def rows(self, checklists):
+        """Observation rows of a slice of checklist IDs."""
+        return slice(int(self.offsets[checklists.start]), int(self.offsets[checklists.stop]))
+
+    def date_range(self, start, end):
+        """Observation rows dated start..end, both inclusive."""
+        return self.rows(self.date_index.range(start, end))
+
+    def day(self, value):
+        return self.rows(self.date_index.day(value))
+
+    def latest_date(self):
+        return self.checklists["Date"].iloc[-1] if len(self.checklists) else None
+
+    def frame(self, rows=slice(None), columns=COLUMNS):
+        """Observation rows with their checklist and taxon columns joined back on, in the store's flat layout."""
+        observations = self.observations.iloc[rows]
+        checklist = observations["Checklist ID"].to_numpy()
+        taxon = observations["Taxon ID"].to_numpy()
+        joined = {}
+        for col in columns:
+            if col in TAXON_COLUMNS:
+                joined[col] = self.taxonomy[col].iloc[taxon].array
+            elif col in self.checklists.columns:
+                joined[col] = self.checklists[col].iloc[checklist].array
+            else:
+                joined[col] = observations[col].astype(OBSERVATION_TYPES[col]).array
+        return pd.DataFrame(joined, columns=columns)
+
+    # === Per-checklist metrics ===
+    def species_per_checklist(self):
+        """Species reported on each checklist, indexed by checklist ID."""
+        present = self.observations["Present"].to_numpy()
+        ids = self.observations["Checklist ID"].to_numpy()[present]
+        return pd.Series(np.bincount(ids, minlength=len(self.checklists)), index=self.checklists.index, name="Species")
+
+    def checklist_hours(self):
+        """Effort of each checklist in hours; NaN where the duration is unknown or zero."""
+        minutes = self.checklists["Duration Minutes"].astype("Float64").to_numpy(dtype=float, na_value=np.nan)
+        return np.where(minutes > 0, minutes / 60, np.nan)
+
+    def counts_per_hour(self):
+        """Effort-normalized count of each observation (individuals per hour of its checklist)."""
+        hours = self.checklist_hours()[self.observations["Checklist ID"].to_numpy()]
+        counts = self.observations["Count"].astype("Float64").to_numpy(dtype=float, na_value=np.nan)
+        return pd.Series(counts / hours, index=self.observations.index, name="Count per Hour")
+
+    def checklist_metrics(self, checklists=slice(None)):
+        """One row per checklist: its columns, species and individuals reported, and both per hour of effort."""
+        ids = self.observations["Checklist ID"].to_numpy()
+        counts = self.observations["Count"].fillna(0).to_numpy(dtype=np.int64)
+        metrics = self.checklists.assign(
+            Species=self.species_per_checklist().to_numpy(),
+            Individuals=np.bincount(ids, weights=counts, minlength=len(self.checklists)).astype(np.int64)
+        )
+        hours = self.checklist_hours()
+        metrics["Species per Hour"] = metrics["Species"] / hours
+        metrics["Individuals per Hour"] = metrics["Individuals"] / hours
+        return metrics.iloc[checklists]
+
+    def species_totals(self, rows=slice(None)):
+        """
+        Per species over a slice of observation rows: checklists reporting it
+        and individuals counted, most reported first.
+        """
+        observations = self.observations.iloc[rows]
+        present = observations["Present"].to_numpy(dtype=bool)
+        checklist = observations["Checklist ID"].to_numpy()[present]
+        counts = observations["Count"].fillna(0).to_numpy(dtype=np.int64)[present]
+        # Taxa sharing a common name are one species here
+        species_of_taxon, names = pd.factorize(self.taxonomy["Species"])
+        species = species_of_taxon[observations["Taxon ID"].to_numpy()[present]]
+        pairs = np.unique(np.column_stack([species, checklist]), axis=0)
+        totals = pd.DataFrame({
+            "Species": pd.Categorical(names),
+            "Checklists": np.bincount(pairs[:, 0], minlength=len(names)).astype(np.int64),
+            "Individuals": np.bincount(species, weights=counts, minlength=len(names)).astype(np.int64)
+        })
+        totals = totals[totals["Checklists"] > 0]
+        return totals.sort_values(["Checklists", "Individuals", "Species"], ascending=[False, False, True],
+                                  kind="mergesort").reset_index(drop=True)
+
+    def memory_bytes(self):
+        """Resident size of the three tables."""
+        return sum(int(t.memory_usage(deep=True).sum()) for t in (self.checklists, self.taxonomy, self.observations))
@@ -0,0 +1,623 @@
+"""
+Typed columnar store for the eBird checklist history.
+
+historical_checklists.csv is only an import/export format. update_data.py
+appends cleaned observations to the partitioned store under data/ebird/ and
+the eBird dashboard reads just the columns it needs straight from it.
+
+CSV imports stream in fixed-size chunks, so full "My eBird Data" or regional
+EBD exports load with bounded memory:
+    python ebird_store.py append ebd_US-TX_relMay-2025.txt
+"""
+import argparse
+import chardet
+import csv
+import hashlib
+import json
+import warnings
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pathlib import Path
+import timing
+
+# === Constants ===
+SCHEMA_VERSION = 6
+DATA_DIR = Path("data")
+STORE_DIR = DATA_DIR / "ebird"
+META_FILE = STORE_DIR / "_meta.json"
+# Single-file store written by schema version 1; removed on the next import
+LEGACY_STORE_FILE = DATA_DIR / "ebird_data.parquet"
+CSV_FILE = Path("historical_checklists.csv")
+
+STORE_COLUMNS = ["Observation ID", "Global ID", "Location ID", "Observer ID", "Species", "Scientific Name", "Date", "Time",
+                 "Protocol", "Duration Minutes", "Observers", "Count", "Present"]
+DASHBOARD_COLUMNS = ["Species", "Scientific Name", "Date", "Time", "Count"]
+CATEGORY_COLUMNS = ["Location ID", "Observer ID", "Species", "Scientific Name", "Time", "Protocol"]
+# Hotspots the dashboard covers; imports keep only these
+HEADWATERS_LOCATIONS = ["L1210588", "L1210849"]
+# Rows per import chunk: bounds import memory whatever the file size
+IMPORT_CHUNK_ROWS = 100_000
+
+# Every spelling of each column across the eBird exports we import
+COLUMN_MAP = {
+    "SPECIES": ["COMMON NAME", "SPECIES"],
+    "SCIENTIFIC NAME": ["SCIENTIFIC NAME"],
+    "COUNT": ["COUNT", "OBSERVATION COUNT", "HOW MANY", "NUMBER OBSERVED"],
+    "DATE": ["OBSERVATION DATE", "DATE"],
+    "TIME": ["TIME OBSERVATIONS STARTED", "TIME"]
+}
+OPTIONAL_COLUMN_MAP = {
+    "GLOBAL ID": ["GLOBAL UNIQUE IDENTIFIER", "GLOBAL ID"],
+    "SUBMISSION ID": ["SUBMISSION ID", "SAMPLING EVENT IDENTIFIER"],
+    "LOCATION ID": ["LOCALITY ID", "LOCATION ID"],
+    "OBSERVER ID": ["OBSERVER ID"],
+    "PROTOCOL": ["PROTOCOL", "OBSERVATION TYPE", "PROTOCOL TYPE"],
+    "DURATION MINUTES": ["DURATION MINUTES", "DURATION (MIN)"],
+    "OBSERVERS": ["OBSERVERS", "NUMBER OBSERVERS", "NUMBER OF OBSERVERS"]
+}
+SNIFF_BYTES = 65536
+
+# === Cleaning ===
+def resolve_columns(columns):
+    """Map our canonical keys to the header names present in an export, or None if a required one is missing."""
+    upper = {c.strip().upper(): c for c in columns}
+    resolved = {}
+    for key, options in {**COLUMN_MAP, **OPTIONAL_COLUMN_MAP}.items():
+        for opt in options:
+            if opt in upper:
+                resolved[key] = upper[opt]
+                break
+    if any(key not in resolved for key in COLUMN_MAP):
+        return None
+    return resolved
+
+def parse_counts(raw):
+    """
+    eBird counts are integers or "X" (present, not counted).
+    Returns (nullable Int32 count, presence flag) instead of turning X into 0.
+    """
+    raw = raw.astype("string").str.strip()
+    count = pd.to_numeric(raw, errors="coerce").astype("Int32")
+    present = (raw.str.upper() == "X").fillna(False) | (count > 0).fillna(False)
+    return count, present.astype(bool)
+
+def natural_ids(location, date, time, observer, scientific_name):
+    """
+    Checklist-and-species ID of rows with neither a submission nor a GUID:
+    locality, date, start time and observer (which together stand for the
+    checklist) plus the scientific name. NA where the locality, date or
+    species is missing, so such rows are never taken for one another.
+    """
+    rows = pd.RangeIndex(len(scientific_name))
+    def text(values):
+        if values is None:
+            return pd.Series(pd.NA, index=rows, dtype="string")
+        return pd.Series(values, dtype="string").str.strip().set_axis(rows)
+    day = pd.Series(date).dt.strftime("%Y-%m-%d").astype("string").set_axis(rows)
+    parts = [text(location), day, text(time).fillna(""), text(observer).fillna(""), text(scientific_name)]
+    return parts[0].str.cat(parts[1:], sep="|")
+
+def observation_ids(submission, scientific_name, global_id, natural_id=None):
+    """
+    (Observation ID, Global ID) of each row. The Observation ID is the
+    submission plus the scientific name, which the API, "My eBird Data" and
+    EBD exports all carry; an export with only a GUID (like
+    historical_checklists.csv) falls back to the Global ID, eBird's "OBS..."
+    observation ID, which the API and the EBD also carry, and a row with
+    neither to natural_id (see natural_ids()). A row matching a stored one
+    on either ID is the same sighting.
+    """
+    global_id = None if global_id is None else global_id.astype("string").str.strip().str.rsplit(":", n=1).str[-1]
+    if submission is None:
+        observation_id = global_id
+    else:
+        observation_id = submission.astype("string").str.strip() + ":" + scientific_name.astype("string").str.strip()
+        observation_id = observation_id if global_id is None else observation_id.fillna(global_id)
+    if natural_id is not None:
+        natural_id = natural_id.set_axis(scientific_name.index)
+        observation_id = natural_id if observation_id is None else observation_id.fillna(natural_id)
+    return observation_id, global_id
+
+def clean_ebird_data(df):
+    """Normalize a parsed eBird export (any of its column spellings) to the store columns in one pass."""
+    if df.empty: return df
+    resolved = resolve_columns(df.columns)
+    if resolved is None: return pd.DataFrame()
+    count, present = parse_counts(df[resolved["COUNT"]])
+    date = pd.to_datetime(df[resolved["DATE"]], errors="coerce")
+    optional = {key: df[resolved[key]] if key in resolved else None for key in ("LOCATION ID", "OBSERVER ID")}
+    observation_id, global_id = observation_ids(
+        df[resolved["SUBMISSION ID"]] if "SUBMISSION ID" in resolved else None,
+        df[resolved["SCIENTIFIC NAME"]],
+        # A GUID is "URN:CornellLabOfOrnithology:EBIRD:OBS..."
+        df[resolved["GLOBAL ID"]] if "GLOBAL ID" in resolved else None,
+        natural_ids(optional["LOCATION ID"], date, df[resolved["TIME"]], optional["OBSERVER ID"], df[resolved["SCIENTIFIC NAME"]])
+    )
+    df_cleaned = pd.DataFrame({
+        "Observation ID": observation_id,
+        "Global ID": global_id,
+        "Location ID": optional["LOCATION ID"],
+        "Observer ID": optional["OBSERVER ID"],
+        "Species": df[resolved["SPECIES"]],
+        "Scientific Name": df[resolved["SCIENTIFIC NAME"]],
+        "Date": date,
+        "Time": df[resolved["TIME"]],
+        "Protocol": df[resolved["PROTOCOL"]] if "PROTOCOL" in resolved else None,
+        "Duration Minutes": df[resolved["DURATION MINUTES"]] if "DURATION MINUTES" in resolved else None,
+        "Observers": df[resolved["OBSERVERS"]] if "OBSERVERS" in resolved else None,
+        "Count": count,
+        "Present": present
+    })
+    return to_store_dtypes(df_cleaned.dropna(subset=["Date"]))
+
+def clean_api_observations(observations):
+    """Map eBird API /data/obs records onto the store columns."""
+    if not observations:
+        return to_store_dtypes(pd.DataFrame(columns=STORE_COLUMNS))
+    api_df = pd.DataFrame(observations).reindex(columns=["subId", "obsId", "locId", "comName", "sciName", "obsDt", "howMany"])
+    obs_dt = pd.to_datetime(api_df["obsDt"], format="ISO8601", errors="coerce")
+    has_time = api_df["obsDt"].astype(str).str.len() > 10
+    # The API leaves howMany out for X counts
+    count, present = parse_counts(api_df["howMany"].astype("string").fillna("X"))
+    # obsId comes with detail=full (see ebird_fetch.fetch_day)
+    observation_id, global_id = observation_ids(api_df["subId"], api_df["sciName"], api_df["obsId"])
+    df_cleaned = pd.DataFrame({
+        "Observation ID": observation_id,
+        "Global ID": global_id,
+        "Location ID": api_df["locId"],
+        "Species": api_df["comName"],
+        "Scientific Name": api_df["sciName"],
+        "Date": obs_dt.dt.normalize(),
+        "Time": obs_dt.dt.strftime("%I:%M:%S %p").str.lstrip("0").where(has_time),
+        "Count": count,
+        "Present": present
+    })
+    return to_store_dtypes(df_cleaned.dropna(subset=["Date"]))
+
+def to_store_dtypes(df):
+    """Cast a cleaned frame to the store schema (categoricals, datetime64 dates, nullable counts)."""
+    df = df.reindex(columns=STORE_COLUMNS).copy()
+    for col in ["Observation ID", "Global ID"]:
+        df[col] = df[col].astype("string")
+    for col in CATEGORY_COLUMNS:
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("string").astype("category")
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce").astype("datetime64[ns]")
+    df["Count"] = pd.to_numeric(df["Count"], errors="coerce").astype("Int32")
+    df["Duration Minutes"] = pd.to_numeric(df["Duration Minutes"], errors="coerce").astype("Int32")
+    df["Observers"] = pd.to_numeric(df["Observers"], errors="coerce").astype("Int16")
+    df["Present"] = df["Present"].astype("boolean").fillna(True).astype(bool)
+    return df.reset_index(drop=True)
+
+# === CSV import / export ===
+def sniff_format(path, sample_bytes=SNIFF_BYTES):
+    """Decide encoding and delimiter once, from a sample of the file. Returns (encoding, sep)."""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    if sample.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    else:
+        detected = chardet.detect(sample)
+        encoding = detected["encoding"] if detected["encoding"] and detected["confidence"] >= 0.5 else "cp1252"
+        # ASCII is a subset of both; cp1252 also decodes the odd accented name past the sample
+        if encoding.lower() == "ascii":
+            encoding = "cp1252"
+    text = sample.decode(encoding, errors="replace")
+    header = text.splitlines()[0] if text else ""
+    try:
+        sep = csv.Sniffer().sniff(header, delimiters=",\t;|").delimiter
+    except csv.Error:
+        sep = "\t" if header.count("\t") > header.count(",") else ","
+    return encoding, sep
+
+def new_import_report():
+    return {"rows_read": 0, "bad_lines": 0, "bad_line_numbers": [], "other_locations": 0,
+            "invalid": 0, "duplicates": 0, "added": 0, "chunks": 0}
+
+def format_import_report(report):
+    skipped = f"{report['bad_lines']} malformed line(s) skipped"
+    if report["bad_line_numbers"]:
+        skipped += (" (line " if report["bad_lines"] == 1 else " (lines ") + ", ".join(str(n) for n in report["bad_line_numbers"]) + ("…" if report["bad_lines"] > len(report["bad_line_numbers"]) else "") + ")"
+    return (f"Read {report['rows_read']} rows in {report['chunks']} chunk(s): {report['added']} added, "
+            f"{report['duplicates']} duplicate(s), {report['other_locations']} from other locations, "
+            f"{report['invalid']} without a usable date; {skipped}.")
+
+def count_bad_lines(caught, report):
+    """Tally the C parser's "Skipping line N: ..." warnings (one per malformed line)."""
+    for warning in caught:
+        if not issubclass(warning.category, pd.errors.ParserWarning):
+            continue
+        for line in str(warning.message).splitlines():
+            if line.startswith("Skipping line"):
+                report["bad_lines"] += 1
+                if len(report["bad_line_numbers"]) < 10:
+                    report["bad_line_numbers"].append(int(line.split()[2].rstrip(":")))
+    caught.clear()
+
+def read_ebird_chunks(path=CSV_FILE, locations=None, chunksize=IMPORT_CHUNK_ROWS, report=None):
+    """
+    Stream a raw eBird CSV/TSV export as cleaned store-schema frames of at most
+    chunksize rows. Encoding and delimiter are sniffed once; rows outside
+    `locations` (when the export has a location column) are dropped before
+    cleaning. Malformed lines are skipped but counted in `report`.
+    """
+    report = new_import_report() if report is None else report
+    encoding, sep = sniff_format(path)
+    header = pd.read_csv(path, sep=sep, encoding=encoding, nrows=0).columns
+    resolved = resolve_columns(header)
+    if resolved is None:
+        return
+    # Every column is parsed (usecols would hide rows with extra fields from the
+    # C parser's bad-line check); the ones we drop are read as plain strings
+    dtypes = {col: str for col in header}
+    dtypes |= {resolved[key]: "category" for key in ("SPECIES", "SCIENTIFIC NAME", "TIME", "LOCATION ID", "OBSERVER ID", "PROTOCOL") if key in resolved}
+    dtypes[resolved["COUNT"]] = "string"
+    keep = list(dict.fromkeys(resolved.values()))
+    wanted = set(locations) if locations is not None and "LOCATION ID" in resolved else None
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        reader = pd.read_csv(path, sep=sep, encoding=encoding, engine="c", dtype=dtypes,
+                             on_bad_lines="warn", chunksize=chunksize)
+        for chunk in reader:
+            count_bad_lines(caught, report)
+            report["chunks"] += 1
+            report["rows_read"] += len(chunk)
+            chunk = chunk[keep]
+            if wanted is not None:
+                here = chunk[resolved["LOCATION ID"]].isin(wanted).to_numpy()
+                report["other_locations"] += int((~here).sum())
+                chunk = chunk[here]
+            with timing.stage("ebird.clean", rows_in=len(chunk)) as t:
+                cleaned = clean_ebird_data(chunk)
+                t["rows_out"] = len(cleaned)
+            report["invalid"] += len(chunk) - len(cleaned)
+            if len(cleaned):
+                yield cleaned
+        count_bad_lines(caught, report)
+
+def read_ebird_csv(path=CSV_FILE, locations=None, report=None):
+    """Parse a whole eBird export into one cleaned frame (small files; imports stream instead)."""
+    with timing.stage("ebird.parse_csv") as t:
+        chunks = list(read_ebird_chunks(path, locations, report=report))
+        df = to_store_dtypes(pd.concat(chunks, ignore_index=True)) if chunks else pd.DataFrame()
+        t["rows_out"] = len(df)
+    return df
+
+def export_csv(path=CSV_FILE):
+    """Write the store back out as a CSV (for sharing; the dashboard never reads it)."""
+    df = read_store(STORE_COLUMNS)
+    df["Count"] = df["Count"].astype("string").mask(df["Present"] & df["Count"].isna(), "X")
+    df.drop(columns="Present").to_csv(path, index=False)
+
+def source_fingerprint(path):
+    """Cheap change marker for an append-mostly CSV: its size plus a hash of the tail."""
+    path = Path(path)
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+    return f"{size}:{hashlib.blake2b(tail, digest_size=16).hexdigest()}"
+
+# === Store I/O ===
+# Layout: STORE_DIR holds append-only Parquet partitions, one sorted uint64 key
+# run per partition (hashes of every Observation ID and Global ID in it), and
+# a small _meta.json sidecar that lists them. The sidecar is replaced last, so
+# readers never see a partially written partition.
+def observation_keys(ids):
+    """Hash IDs to uint64 dedupe keys."""
+    ids = pd.Series(ids, dtype="string").reset_index(drop=True)
+    return pd.util.hash_pandas_object(ids, index=False).to_numpy(dtype=np.uint64)
+
+def row_keys(df):
+    """Dedupe keys of each row, shape (rows, 2): its Observation ID and its Global ID (0 where it has none)."""
+    keys = np.zeros((len(df), 2), dtype=np.uint64)
+    for column, name in enumerate(["Observation ID", "Global ID"]):
+        known = df[name].notna().to_numpy()
+        keys[known, column] = observation_keys(df[name][known])
+    return keys
+
+def read_meta():
+    """Return the store sidecar, or None if there is no readable store."""
+    if not META_FILE.exists():
+        return None
+    try:
+        with open(META_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_meta(meta):
+    tmp_file = META_FILE.with_suffix(".json.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(meta, f, indent=2)
+    tmp_file.replace(META_FILE)
+
+def store_exists():
+    return read_meta() is not None
+
+def store_signature():
+    """Change marker for the store's contents (partition names are reused by a re-import), or None without a store."""
+    meta = read_meta()
+    if meta is None:
+        return None
+    return [meta.get("schema_version"), meta.get("source"), [[p["file"], p["rows"], p["max_date"]] for p in meta["partitions"]]]
+
+def write_partition(df, index):
+    """Write one partition and its sorted key run. Returns its sidecar entry."""
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"part-{index:05d}"
+    table = pa.Table.from_pandas(to_store_dtypes(df), preserve_index=False)
+    tmp_file = STORE_DIR / f"{name}.parquet.tmp"
+    pq.write_table(table, tmp_file, compression="zstd")
+    tmp_file.replace(STORE_DIR / f"{name}.parquet")
+    keys = row_keys(df)
+    np.unique(keys[keys != 0]).tofile(STORE_DIR / f"{name}.keys")
+    return {
+        "file": f"{name}.parquet",
+        "keys": f"{name}.keys",
+        "rows": len(df),
+        "min_date": df["Date"].min().strftime("%Y-%m-%d"),
+        "max_date": df["Date"].max().strftime("%Y-%m-%d")
+    }
+
+def known_keys(keys, meta):
+    """Boolean mask of the rows (row_keys()) with either key already present in any partition's key run."""
+    flat = keys.ravel()
+    found = np.zeros(len(flat), dtype=bool)
+    for part in meta["partitions"]:
+        path = STORE_DIR / part["keys"]
+        if part["rows"] == 0 or not path.exists():
+            continue
+        # memmap + binary search only touches the pages the lookups land on
+        run = np.memmap(path, dtype=np.uint64, mode="r")
+        pos = np.searchsorted(run, flat).clip(max=len(run) - 1)
+        found |= run[pos] == flat
+    return (found & (flat != 0)).reshape(keys.shape).any(axis=1)
+
+def dedupe(df):
+    """Drop rows sharing either ID with an earlier row of df. Returns (df, keys)."""
+    keys = row_keys(df)
+    flat = keys.ravel()
+    rows = np.repeat(np.arange(len(df)), keys.shape[1])
+    valid = flat != 0
+    # A row is a repeat when one of its keys first appeared on an earlier row
+    first_row = pd.Series(rows[valid]).groupby(flat[valid]).transform("min").to_numpy()
+    repeat = np.zeros(len(df), dtype=bool)
+    repeat[rows[valid][first_row < rows[valid]]] = True
+    return df[~repeat].reset_index(drop=True), keys[~repeat]
+
+def next_partition_index(meta):
+    if not meta:
+        return 0
+    return max((int(p["file"][5:10]) for p in meta["partitions"]), default=-1) + 1
+
+def write_store(df, source=None):
+    """Replace the store with a single partition holding df."""
+    df, _ = dedupe(to_store_dtypes(df))
+    old_meta = read_meta()
+    # A fresh partition index keeps the old files valid until the sidecar swap
+    meta = {
+        "schema_version": SCHEMA_VERSION,
+        "source": source,
+        "rows": len(df),
+        "max_date": df["Date"].max().strftime("%Y-%m-%d") if len(df) else None,
+        "partitions": [write_partition(df, next_partition_index(old_meta))] if len(df) else []
+    }
+    write_meta(meta)
+    if old_meta:
+        remove_partitions(old_meta.get("partitions", []), keep=meta["partitions"])
+    if LEGACY_STORE_FILE.exists():
+        LEGACY_STORE_FILE.unlink()
+    return meta
+
+def remove_partitions(partitions, keep=()):
+    keep_files = {p["file"] for p in keep}
+    for part in partitions:
+        if part["file"] in keep_files:
+            continue
+        for name in (part["file"], part["keys"]):
+            (STORE_DIR / name).unlink(missing_ok=True)
+
+def append_observations(df):
+    """
+    Append only the observations the store has not seen before.
+    Reads just the sidecar and the key runs; existing partitions are never rewritten.
+    Returns the number of rows appended.
+    """
+    meta = read_meta()
+    if meta is None:
+        return write_store(df)["rows"]
+    df, keys = dedupe(to_store_dtypes(df))
+    new = ~known_keys(keys, meta)
+    df = df[new]
+    if df.empty:
+        return 0
+    part = write_partition(df, next_partition_index(meta))
+    meta["partitions"].append(part)
+    meta["rows"] += part["rows"]
+    meta["max_date"] = max(filter(None, [meta.get("max_date"), part["max_date"]]))
+    write_meta(meta)
+    return part["rows"]
+
+class ObservationWriter:
+    """
+    Streaming sink for the fetch engine: buffers raw API records and appends
+    them to the store in batches, so a long catch-up produces a few
+    partitions instead of one per fetched chunk.
+    """
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        self.pending = []
+        self.received = 0
+        self.added = 0
+
+    def write(self, records):
+        self.pending.extend(records)
+        self.received += len(records)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.added += append_observations(clean_api_observations(self.pending))
+            self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # Keep whatever arrived before an error; the key index makes re-runs safe
+        self.flush()
+
+def compact():
+    """Merge all partitions into one (keeps the partition count, not the data, bounded)."""
+    meta = read_meta()
+    if meta is None or len(meta["partitions"]) <= 1:
+        return meta
+    return write_store(read_store(STORE_COLUMNS), source=meta.get("source"))
+
+def high_water_mark():
+    """Latest observation date in the store, read from the sidecar alone."""
+    meta = read_meta()
+    if meta is None or not meta.get("max_date"):
+        return None
+    return pd.Timestamp(meta["max_date"]).date()
+
+def store_is_current(csv_path=CSV_FILE):
+    """True when the store exists, matches SCHEMA_VERSION and was built from csv_path as it is now."""
+    meta = read_meta()
+    if meta is None or meta.get("schema_version") != SCHEMA_VERSION:
+        return False
+    if meta.get("source") is not None and Path(csv_path).exists():
+        return meta["source"] == source_fingerprint(csv_path)
+    return True
+
+def stream_csv(path, meta, locations, chunksize, report, start_index=None):
+    """
+    Write an export into new partitions listed in meta (updated in place), one
+    partition per chunk, skipping observations meta already holds. Memory stays
+    at about one chunk; the caller publishes meta. Returns the new partitions.
+    """
+    written = []
+    index = next_partition_index(meta) if start_index is None else start_index
+    try:
+        for chunk in read_ebird_chunks(path, locations, chunksize, report):
+            rows = len(chunk)
+            chunk, keys = dedupe(chunk)
+            new = ~known_keys(keys, meta)
+            report["duplicates"] += rows - int(new.sum())
+            chunk = chunk[new]
+            if chunk.empty:
+                continue
+            part = write_partition(chunk, index)
+            index += 1
+            written.append(part)
+            meta["partitions"].append(part)
+            meta["rows"] += part["rows"]
+            meta["max_date"] = max(filter(None, [meta.get("max_date"), part["max_date"]]))
+            report["added"] += part["rows"]
+    except BaseException:
+        # Nothing was published; the store is left as it was
+        remove_partitions(written)
+        raise
+    return written
+
+def import_csv(csv_path=CSV_FILE, locations=HEADWATERS_LOCATIONS, chunksize=IMPORT_CHUNK_ROWS):
+    """(Re)build the store from a CSV export, streamed in fixed-size chunks. Returns the import report."""
+    report = new_import_report()
+    old_meta = read_meta()
+    meta = {"schema_version": SCHEMA_VERSION, "source": source_fingerprint(csv_path),
+            "rows": 0, "max_date": None, "partitions": []}
+    # Partition indexes continue after the old ones, which stay valid until the sidecar swap
+    stream_csv(csv_path, meta, locations, chunksize, report, start_index=next_partition_index(old_meta))
+    write_meta(meta)
+    if old_meta:
+        remove_partitions(old_meta.get("partitions", []), keep=meta["partitions"])
+    if LEGACY_STORE_FILE.exists():
+        LEGACY_STORE_FILE.unlink()
+    return report
+
+def append_csv(path, locations=HEADWATERS_LOCATIONS, chunksize=IMPORT_CHUNK_ROWS):
+    """
+    Add a further export (e.g. a regional EBD) to the store, keeping what is
+    already there and skipping observations it already holds. Returns the
+    import report. A rebuild from historical_checklists.csv (import_csv) starts
+    the store over without it.
+    """
+    report = new_import_report()
+    meta = read_meta()
+    if meta is None:
+        meta = {"schema_version": SCHEMA_VERSION, "source": None, "rows": 0, "max_date": None, "partitions": []}
+    if stream_csv(path, meta, locations, chunksize, report):
+        write_meta(meta)
+    return report
+
+@timing.timed("ebird.read_store")
+def read_store(columns=DASHBOARD_COLUMNS, filter=None):
+    """Read only the requested columns (and, given a pyarrow filter expression, rows) from every partition."""
+    meta = read_meta()
+    if meta is None or not meta["partitions"]:
+        return to_store_dtypes(pd.DataFrame(columns=STORE_COLUMNS))[columns]
+    files = [str(STORE_DIR / p["file"]) for p in meta["partitions"]]
+    table = ds.dataset(files, format="parquet").to_table(columns=columns, filter=filter)
+    df = table.to_pandas()
+    for col in CATEGORY_COLUMNS:
+        # Partitions carry their own dictionaries; keep the merged column categorical
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+def load_history(columns=DASHBOARD_COLUMNS, csv_path=CSV_FILE):
+    """
+    Load the eBird history for the dashboard.
+    Imports the CSV once when the store is missing, stale, or on an old schema.
+    """
+    if store_is_current(csv_path) or (store_exists() and not Path(csv_path).exists()):
+        return read_store(columns)
+    if not Path(csv_path).exists():
+        return pd.DataFrame(columns=columns)
+    try:
+        refresh_store(csv_path)
+    except OSError as e:
+        # Read-only deploys still work, they just re-import on the next cold start.
+        print(f"Warning: could not write {STORE_DIR}: {e}")
+        df = read_ebird_csv(csv_path, HEADWATERS_LOCATIONS)
+        return dedupe(df)[0][columns] if len(df) else pd.DataFrame(columns=columns)
+    return read_store(columns)
+
+def refresh_store(csv_path=CSV_FILE):
+    """Import csv_path when the store is missing, stale, or on an old schema. Returns the import report, or None if nothing was imported."""
+    if store_is_current(csv_path) or not Path(csv_path).exists():
+        return None
+    report = import_csv(csv_path)
+    if report["bad_lines"]:
+        print(f"Warning: {format_import_report(report)}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="eBird store maintenance")
+    parser.add_argument("command", choices=["import", "append", "compact", "export"],
+                        help="import: rebuild from a CSV; append: add an export; compact: merge partitions; export: write the CSV")
+    parser.add_argument("path", nargs="?", default=str(CSV_FILE))
+    parser.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS)
+    parser.add_argument("--all-locations", action="store_true", help=f"keep every location, not just {', '.join(HEADWATERS_LOCATIONS)}")
+    args = parser.parse_args()
+    locations = None if args.all_locations else HEADWATERS_LOCATIONS
+    if args.command == "import":
+        print(format_import_report(import_csv(args.path, locations, args.chunk_rows)))
+    elif args.command == "append":
+        print(format_import_report(append_csv(args.path, locations, args.chunk_rows)))
+    elif args.command == "compact":
+        compact()
+    else:
+        export_csv(args.path)
+    if args.command != "export":
+        # rollups and shared_data import this module, so only the command line pulls them in
+        import rollups
+        import shared_data
+        rollups.update_ebird()
+        shared_data.publish_ebird()
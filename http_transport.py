@@ -0,0 +1,117 @@
+"""
+Pluggable HTTP transport for the eBird and Open-Meteo fetchers.
+
+Both fetchers get their sessions from make_session(), whose adapter is picked
+by the NATURENOTES_HTTP environment variable:
+    live    (default) plain requests, with the retry policy
+    record  as live, and every response that is not a 429/5xx is also saved
+            under NATURENOTES_FIXTURES (default fixtures/http)
+    replay  responses come from the fixtures only; nothing touches the
+            network, and a request that was never recorded fails like a
+            connection error
+
+Fixtures are keyed on the method, path and sorted query string, not the host
+or headers, so responses recorded from the live APIs or from stub_server.py
+replay under either base URL, and API keys (sent as headers) are never
+written to disk.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+# === Constants ===
+MODES = ["live", "record", "replay"]
+DEFAULT_FIXTURE_DIR = "fixtures/http"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def mode():
+    value = os.environ.get("NATURENOTES_HTTP", "live").lower()
+    if value not in MODES:
+        raise ValueError(f"NATURENOTES_HTTP={value!r}; expected one of {MODES}")
+    return value
+
+def fixture_dir():
+    return Path(os.environ.get("NATURENOTES_FIXTURES", DEFAULT_FIXTURE_DIR))
+
+# === Fixtures ===
+def request_key(method, url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{method.upper()} {parts.path}?{query}"
+
+def fixture_path(method, url, directory=None):
+    directory = fixture_dir() if directory is None else Path(directory)
+    return directory / f"{hashlib.sha256(request_key(method, url).encode()).hexdigest()[:24]}.json"
+
+def save_fixture(request, response, directory=None):
+    path = fixture_path(request.method, request.url, directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fixture = {
+        "request": request_key(request.method, request.url),
+        "status_code": response.status_code,
+        "content_type": response.headers.get("Content-Type"),
+        "body": response.content.decode("utf-8")
+    }
+    tmp_file = path.with_suffix(".json.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(fixture, f)
+    tmp_file.replace(path)
+
+class RecordingAdapter(HTTPAdapter):
+    """HTTPAdapter that saves each final response (after retries) as a fixture."""
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code not in RETRY_STATUSES:
+            save_fixture(request, response)
+        return response
+
+class ReplayAdapter(BaseAdapter):
+    """Serves recorded fixtures; never opens a connection."""
+    def send(self, request, **kwargs):
+        path = fixture_path(request.method, request.url)
+        if not path.exists():
+            raise requests.exceptions.ConnectionError(
+                f"No recorded response for {request_key(request.method, request.url)} in {fixture_dir()}", request=request)
+        with open(path) as f:
+            fixture = json.load(f)
+        response = requests.Response()
+        response.status_code = fixture["status_code"]
+        response.headers = CaseInsensitiveDict({"Content-Type": fixture["content_type"] or "application/json"})
+        response._content = fixture["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.reason = "Replayed"
+        return response
+
+    def close(self):
+        pass
+
+# === Sessions ===
+def make_adapter(pool_size, max_retries):
+    if mode() == "replay":
+        return ReplayAdapter()
+    adapter_class = RecordingAdapter if mode() == "record" else HTTPAdapter
+    return adapter_class(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+
+def make_session(pool_size=8, retries=5, backoff=0.5):
+    """A keep-alive session whose pool fits pool_size threads, retrying 429/5xx with backoff, on the configured transport."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = make_adapter(pool_size, retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,83 @@
+"""
+Paginated result tables for the dashboards.
+
+st.dataframe serializes every row it is given to the browser on each rerun.
+paged_table() keeps the result on the server and sends only the current page,
+so render time and payload stay the same whatever the result size. Sorting
+works on row positions, so only the page's rows are taken in sort order. The
+full result is encoded as CSV only when the download is clicked. Streamlit
+serves a download from one bytes object, so that copy is held while the user
+is connected; the chunks are spooled to a temporary file first so the
+encoding never holds them alongside it.
+"""
+import tempfile
+import numpy as np
+import streamlit as st
+
+# === Constants ===
+PAGE_SIZES = [50, 100, 250, 500]
+CSV_CHUNK_ROWS = 50_000
+
+def sort_order(df, column=None, ascending=True):
+    """Row positions of df ordered by one column (stable, blanks last); as-is for None."""
+    if column is None:
+        return np.arange(len(df))
+    values = df[column].reset_index(drop=True)
+    return values.sort_values(ascending=ascending, kind="mergesort", na_position="last").index.to_numpy()
+
+def csv_chunks(df, order=None, chunk_rows=CSV_CHUNK_ROWS):
+    """df as UTF-8 CSV (rows in `order`), encoded chunk_rows rows at a time; the header comes first."""
+    order = np.arange(len(df)) if order is None else order
+    yield df.iloc[:0].to_csv(index=False).encode("utf-8")
+    for start in range(0, len(order), chunk_rows):
+        yield df.iloc[order[start:start + chunk_rows]].to_csv(index=False, header=False).encode("utf-8")
+
+def csv_bytes(df, order=None):
+    """The whole CSV of csv_chunks(), collected through a temporary file (closed and removed before returning)."""
+    with tempfile.TemporaryFile() as f:
+        for chunk in csv_chunks(df, order):
+            f.write(chunk)
+        f.seek(0)
+        return f.read()
+
+def _first_page(key):
+    st.session_state[f"{key}_page"] = 1
+
+def paged_table(df, key, columns=None, sort_columns=None, default_sort=None, file_name="results.csv", **dataframe_kwargs):
+    """
+    Render df one page at a time with sort, page-size and page controls, and
+    a CSV download of the whole sorted result. `key` keeps the widget state
+    of each table apart. Returns the number of rows sent to the browser.
+    """
+    columns = list(df.columns) if columns is None else columns
+    sort_columns = columns if sort_columns is None else sort_columns
+    c1, c2, c3, c4 = st.columns([3, 2, 1, 1])
+    with c1:
+        sort_col = st.selectbox("Sort by", sort_columns, key=f"{key}_sort",
+                                index=sort_columns.index(default_sort) if default_sort in sort_columns else 0,
+                                on_change=_first_page, args=(key,))
+    with c2:
+        sort_dir = st.radio("Order", ["Ascending", "Descending"], horizontal=True, key=f"{key}_order",
+                            on_change=_first_page, args=(key,))
+    with c3:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_size",
+                                 on_change=_first_page, args=(key,))
+    pages = max(1, -(-len(df) // page_size))
+    # A smaller result than last run may have fewer pages than the one we were on
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    with c4:
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+
+    order = sort_order(df, sort_col, sort_dir == "Ascending")
+    start = (page - 1) * page_size
+    window = df.iloc[order[start:start + page_size]][columns]
+    st.dataframe(window, use_container_width=True, hide_index=True, **dataframe_kwargs)
+    if len(df):
+        st.caption(f"Rows {start + 1:,}–{start + len(window):,} of {len(df):,}")
+
+    if len(df):
+        # Deferred: the CSV is only built when the button is clicked, not on every rerun
+        st.download_button("Download CSV", lambda: csv_bytes(df[columns], order), file_name=file_name,
+                           mime="text/csv", key=f"{key}_download", on_click="ignore")
+    return len(window)
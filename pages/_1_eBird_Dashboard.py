@@ -5,102 +5,112 @@ import altair as alt
 import datetime
 from pathlib import Path
 from dateutil.relativedelta import relativedelta
+import climate_views
+import ebird_model
+import ebird_store
+import paged_table
+import presence
+import rollups
+import shared_data
+import timing
+import warmup
+import weather
+
+# === Constants ===
+HEADWATERS_LOCATIONS = ebird_store.HEADWATERS_LOCATIONS
+LATITUDE = 29.4689
+LONGITUDE = -98.4798
+DATA_DIR = ebird_store.DATA_DIR
+EBIRD_DATA_FILE = Path("historical_checklists.csv")
+
+# === API Fetch Functions ===
+def fetch_weather_data(lat, lon, start, end):
+    # Served from the shared on-disk store; only missing days hit Open-Meteo
+    try:
+        return weather.get_daily(lat, lon, start, end)
+    except Exception as e:
+        st.error(f"Error fetching weather data: {e}")
+        return pd.DataFrame(columns=weather.COLUMNS)
+
+def current_ebird_version():
+    """
+    Import the CSV into the store if it changed, and publish the store as the
+    shared dataset if that changed; the version to load, None to load in memory.
+    """
+    if not (EBIRD_DATA_FILE.exists() or ebird_store.store_exists()):
+        return None
+    try:
+        return shared_data.publish_ebird(EBIRD_DATA_FILE)
+    except OSError as e:
+        # Read-only deploys fall back to loading the history per process
+        print(f"Warning: could not write {DATA_DIR}: {e}")
+        return None
+
+@st.cache_resource(max_entries=1)
+def load_ebird_tables(version):
+    timing.cache_miss()
+    # Normalized checklist/observation/taxonomy tables, shared read-only by every session
+    if version is not None:
+        # The tables ingest published, memory-mapped (observations without a copy); a new version replaces them
+        return shared_data.read_ebird()
+    if EBIRD_DATA_FILE.exists() or ebird_store.store_exists():
+        history = ebird_store.load_history(ebird_model.COLUMNS, EBIRD_DATA_FILE)
+        return ebird_model.EbirdTables(weather.attach(history, weather.read_climate()))
+    return None
+
+@st.cache_data
+def load_activity_rollups(version):
+    timing.cache_miss()
+    # Day/week/month tables materialized at ingest; folds in any partitions appended since
+    # (version is only the cache key, so they are re-read along with a newly published store)
+    return rollups.ebird_rollups()
+
+@st.cache_resource(max_entries=1)
+def load_presence_matrix(version):
+    timing.cache_miss()
+    # Species x checklist presence with week/year rollups; read-only, shared across sessions
+    return presence.PresenceMatrix(load_ebird_tables(version).frame(columns=presence.COLUMNS))
 
 def main():
-    # === Constants ===
-    HEADWATERS_LOCATIONS = ["L1210588", "L1210849"]
-    LATITUDE = 29.4689
-    LONGITUDE = -98.4798
-    DATA_DIR = Path("data")
-    EBIRD_DATA_FILE = Path("historical_checklists.csv")
-    
-    # === API Fetch Functions ===
-    @st.cache_data(ttl=3600)
-    def fetch_weather_data(lat, lon, start, end):
-        url = "https://archive-api.open-meteo.com/v1/archive"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "start_date": start.strftime("%Y-%m-%d"),
-            "end_date": end.strftime("%Y-%m-%d"),
-            "daily": ["temperature_2m_max", "temperature_2m_min", "precipitation_sum"],
-            "timezone": "America/Chicago"
-        }
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            return pd.DataFrame({
-                "Date": pd.to_datetime(data.get("daily", {}).get("time", [])),
-                "temp_max": [(t * 9/5 + 32) if t is not None else None for t in data.get("daily", {}).get("temperature_2m_max", [])],
-                "temp_min": [(t * 9/5 + 32) if t is not None else None for t in data.get("daily", {}).get("temperature_2m_min", [])],
-                "precipitation": [(p * 0.0393701) if p is not None else None for p in data.get("daily", {}).get("precipitation_sum", [])]
-            })
-        except Exception as e:
-            st.error(f"Error fetching weather data: {e}")
-            return pd.DataFrame(columns=["Date", "temp_max", "temp_min", "precipitation"])
-    
-    @st.cache_data
-    def load_ebird_data_from_file():
-        if EBIRD_DATA_FILE.exists():
-            df = pd.read_csv(EBIRD_DATA_FILE, sep=None, engine="python", encoding="cp1252", on_bad_lines="skip")
-            return clean_ebird_data(df)
-        else:
-            st.warning("eBird data file not found.")
-            return pd.DataFrame()
-    
-    @st.cache_data
-    def clean_ebird_data(df):
-        if df.empty: return df
-        if len(df.columns) == 1 and "\t" in df.columns[0]:
-            df = df.iloc[:, 0].str.split("\t", expand=True)
-            df.columns = [c.strip() for c in df.iloc[0]]
-            df = df.iloc[1:].reset_index(drop=True)
-        df.columns = [c.strip().upper() for c in df.columns]
-        column_map = {
-            "SPECIES": ["COMMON NAME", "SPECIES"],
-            "SCIENTIFIC NAME": ["SCIENTIFIC NAME"],
-            "COUNT": ["COUNT", "OBSERVATION COUNT", "HOW MANY", "NUMBER OBSERVED"],
-            "DATE": ["OBSERVATION DATE", "DATE"],
-            "TIME": ["TIME OBSERVATIONS STARTED", "TIME"]
-        }
-        resolved = {}
-        for key, options in column_map.items():
-            for opt in options:
-                if opt in df.columns:
-                    resolved[key] = opt
-                    break
-        if len(resolved) < 5: return pd.DataFrame()
-        df_cleaned = pd.DataFrame({
-            "Species": df[resolved["SPECIES"]],
-            "Scientific Name": df[resolved["SCIENTIFIC NAME"]],
-            "Date": pd.to_datetime(df[resolved["DATE"]], errors="coerce"),
-            "Time": df[resolved["TIME"]],
-            "Count": pd.to_numeric(df[resolved["COUNT"]], errors="coerce").fillna(0).astype(int)
-        })
-        return df_cleaned.dropna(subset=["Date"])
-    
     # === HEADER ===
     st.markdown("<h1 style='text-align: center;'>🌳 Nature Notes: Headwaters at Incarnate Word 🌳</h1>", unsafe_allow_html=True)
     
     # === Data Loading ===
     MIN_DATE = datetime.date(1985, 1, 1)
     MAX_DATE = datetime.date(2035, 12, 31)
-    ebird_df = load_ebird_data_from_file()
+    with timing.stage("ebird.load", cached=True) as t:
+        version = current_ebird_version()
+        tables = load_ebird_tables(version)
+        t["rows_out"] = len(tables) if tables is not None else 0
     
-    if ebird_df.empty:
+    if tables is None:
+        st.warning("eBird data file not found.")
+    if tables is None or not len(tables):
         st.error("No eBird data found.")
         return
 
     # === Latest Checklist ===
     st.subheader("🆕 Latest Checklist 🆕")
-    latest_date = ebird_df["Date"].max()
-    latest_df = ebird_df[ebird_df["Date"] == latest_date].copy()
+    latest_date = tables.latest_date()
+    latest_df = tables.frame(tables.day(latest_date), ["Species", "Scientific Name", "Count"])
     st.write(f"**Checklist from:** {latest_date.strftime('%Y-%m-%d')}")
-    st.dataframe(latest_df[["Species", "Scientific Name", "Count"]], use_container_width=True, hide_index=True)
+    st.dataframe(latest_df, use_container_width=True, hide_index=True)
+    # Per-checklist effort and yield, from integer checklist IDs
+    latest_checklists = tables.checklist_metrics(tables.date_index.day(latest_date))
+    st.dataframe(
+        latest_checklists[["Time", "Protocol", "Duration Minutes", "Species", "Individuals", "Species per Hour", "Individuals per Hour"]],
+        column_config={col: st.column_config.NumberColumn(format="%.1f") for col in ["Species per Hour", "Individuals per Hour"]},
+        use_container_width=True, hide_index=True
+    )
 
     # === Weather ===
-    weather_latest = fetch_weather_data(LATITUDE, LONGITUDE, latest_date.date(), latest_date.date())
+    if warmup.in_progress("weather"):
+        # Don't hold the page on the network while the background warm-up is fetching it
+        weather_latest = pd.DataFrame()
+        st.caption("Weather is still loading in the background; it will appear on the next refresh.")
+    else:
+        with timing.stage("ebird.weather"):
+            weather_latest = fetch_weather_data(LATITUDE, LONGITUDE, latest_date.date(), latest_date.date())
     if not weather_latest.empty:
         st.subheader(f"Weather for {latest_date.date()}")
         st.dataframe(weather_latest, use_container_width=True, hide_index=True)
@@ -110,8 +120,111 @@ def main():
     d1 = st.date_input("Start Date", latest_date - datetime.timedelta(days=30))
     d2 = st.date_input("End Date", latest_date)
     
-    filtered = ebird_df[(ebird_df["Date"] >= pd.to_datetime(d1)) & (ebird_df["Date"] <= pd.to_datetime(d2))]
-    st.dataframe(filtered, use_container_width=True, hide_index=True)
+    with timing.stage("ebird.filter", rows_in=len(tables)) as t:
+        # Checklist IDs follow date order, so the range is one slice of the observations
+        filtered = tables.frame(tables.date_range(d1, d2), ebird_store.DASHBOARD_COLUMNS)
+        t["rows_out"] = len(filtered)
+    with timing.stage("ebird.render", rows_in=len(filtered)) as t:
+        # Only the current page goes to the browser
+        t["rows_out"] = paged_table.paged_table(filtered, key="ebird_filtered", default_sort="Date", file_name="ebird_observations.csv")
+
+    with timing.stage("ebird.species_totals") as t:
+        species_totals = tables.species_totals(tables.date_range(d1, d2))
+        t["rows_out"] = len(species_totals)
+    if not species_totals.empty:
+        st.write(f"**{len(species_totals)} species** reported in this range")
+        st.dataframe(species_totals, use_container_width=True, hide_index=True)
+
+    # === Activity Over Time ===
+    st.subheader("📈 Activity Over Time 📈")
+    grain = st.radio("Group by", rollups.GRAINS, index=2, horizontal=True, format_func=str.title)
+    with timing.stage("ebird.activity", cached=True) as t:
+        activity_tables = load_activity_rollups(version)
+        # Periods overlapping the date range above, read from the pre-aggregated tables
+        period_from, period_to = rollups.period_start([d1], grain).iloc[0], pd.Timestamp(d2)
+        totals = activity_tables["totals"][grain]
+        totals = totals[totals["Date"].between(period_from, period_to)]
+        species = activity_tables["species"][grain]
+        species = species[species["Date"].between(period_from, period_to)]
+        activity = (
+            totals.groupby("Date")[["Checklists"]].sum()
+            .join(species.groupby("Date")["Species"].nunique())
+            .reset_index()
+        )
+        t["rows_out"] = len(activity)
+
+    if activity.empty:
+        st.info("No checklists in the selected date range.")
+    else:
+        activity_long = activity.melt("Date", var_name="Measure", value_name="Value")
+        st.altair_chart(
+            alt.Chart(activity_long).mark_line(point=True).encode(
+                x=alt.X("Date:T", title=grain.title()),
+                y=alt.Y("Value:Q", title=None),
+                color=alt.Color("Measure:N", title=None),
+                tooltip=[alt.Tooltip("Date:T"), "Measure", "Value"]
+            ).properties(title="Checklists and species per " + grain),
+            use_container_width=True
+        )
+
+    # === Weather and Activity ===
+    st.subheader("🌦️ Weather and Activity 🌦️")
+    st.caption("Every checklist since 1985 against the weather of its day, from the local climate table.")
+    abundance = st.radio("Measure", ["Species", "Species per Hour", "Individuals per Hour"], horizontal=True, key="ebird_weather_value")
+    with timing.stage("ebird.weather_abundance", rows_in=len(tables.checklists)) as t:
+        checklist_weather = tables.checklist_metrics()
+        t["rows_out"] = len(checklist_weather)
+    climate_views.weather_vs_abundance(checklist_weather, abundance, key="ebird_weather")
+
+    # === Seasonality ===
+    st.subheader("📊 Seasonal Frequency 📊")
+    st.caption("Share of checklists reporting each species, by week of year and by year.")
+    with timing.stage("ebird.presence", cached=True) as t:
+        matrix = load_presence_matrix(version)
+        t["rows_out"] = matrix.n_checklists
+    chosen = st.multiselect("Species to chart", list(matrix.species), default=list(matrix.overall_frequency().index[:5]))
+
+    if chosen:
+        with timing.stage("ebird.frequency", rows_in=len(chosen)):
+            weekly = matrix.weekly_frequency(chosen)
+            yearly = matrix.yearly_frequency(chosen)
+            if len(chosen) > 1:
+                # Checklists reporting any of the chosen species, from the OR of their presence bits
+                weekly["Any selected"] = matrix.group_frequency(chosen, by="week")
+                yearly["Any selected"] = matrix.group_frequency(chosen, by="year")
+        weekly_long = weekly.reset_index().melt("Week", var_name="Species", value_name="Frequency")
+        yearly_long = yearly.reset_index().melt("Year", var_name="Species", value_name="Frequency")
+
+        st.altair_chart(
+            alt.Chart(weekly_long).mark_line(point=True).encode(
+                x=alt.X("Week:Q", scale=alt.Scale(domain=[1, presence.WEEKS]), title="Week of year"),
+                y=alt.Y("Frequency:Q", axis=alt.Axis(format="%")),
+                color="Species:N",
+                tooltip=["Species", "Week", alt.Tooltip("Frequency:Q", format=".0%")]
+            ).properties(title="Seasonal frequency"),
+            use_container_width=True
+        )
+        st.altair_chart(
+            alt.Chart(yearly_long).mark_line(point=True).encode(
+                x=alt.X("Year:O"),
+                y=alt.Y("Frequency:Q", axis=alt.Axis(format="%")),
+                color="Species:N",
+                tooltip=["Species", "Year", alt.Tooltip("Frequency:Q", format=".0%")]
+            ).properties(title="Year over year"),
+            use_container_width=True
+        )
+
+    st.subheader("🗓️ Expected This Week 🗓️")
+    min_frequency = st.slider("Reported on at least this share of checklists", 5, 100, 25, step=5, format="%d%%")
+    expected = matrix.expected(datetime.date.today(), min_frequency=min_frequency / 100)
+    if expected.empty:
+        st.info("No species reach that frequency in this week of the year.")
+    else:
+        st.dataframe(
+            pd.DataFrame({"Species": expected.index, "Frequency": expected.to_numpy() * 100}),
+            column_config={"Frequency": st.column_config.ProgressColumn("Frequency", min_value=0, max_value=100, format="%.0f%%")},
+            use_container_width=True, hide_index=True
+        )
 
     # === Footer ===
     st.markdown("---")
@@ -2,6 +2,11 @@ import streamlit as st
 import pandas as pd
 import requests
 from datetime import datetime
+import butterfly_store
+import climate_views
+import timing
+import warmup
+import weather
 
 # -------------------------
 # WEATHER HELPER & CONSTANTS
@@ -9,32 +14,31 @@ from datetime import datetime
 LATITUDE = 29.4678
 LONGITUDE = -98.4750
 
-@st.cache_data
-def fetch_weather_data(lat, lon, date_obj):
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "start_date": date_obj.strftime('%Y-%m-%d'),
-        "end_date": date_obj.strftime('%Y-%m-%d'),
-        "daily": ["temperature_2m_max", "temperature_2m_min", "precipitation_sum"],
-        "temperature_unit": "fahrenheit",
-        "precipitation_unit": "inch",
-        "timezone": "America/Chicago"
-    }
+def fetch_weather_data(lat, lon, dates):
+    # One batched lookup for all the given survey dates, served from the shared on-disk store;
+    # only missing days hit Open-Meteo. Indexed by date, with days the archive lacks dropped.
     try:
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            daily = data.get("daily", {})
-            return pd.DataFrame({
-                "Max Temp": daily.get("temperature_2m_max", []),
-                "Min Temp": daily.get("temperature_2m_min", []),
-                "Precipitation": daily.get("precipitation_sum", [])
-            })
-    except:
-        pass
-    return pd.DataFrame()
+        daily = weather.get_dates(lat, lon, dates)
+    except Exception:
+        return pd.DataFrame()
+    return daily.rename(columns={
+        "temp_max": "Max Temp",
+        "temp_min": "Min Temp",
+        "precipitation": "Precipitation"
+    })[["Max Temp", "Min Temp", "Precipitation"]].dropna(how="all")
+
+@st.cache_resource(max_entries=1)
+def load_survey_matrix(signature):
+    timing.cache_miss()
+    # Rebuilt only when a season's CSV is added or changed; read-only and shared across sessions
+    return butterfly_store.SurveyMatrix(butterfly_store.load_surveys())
+
+@st.cache_data
+def load_survey_totals(signature, climate_signature):
+    timing.cache_miss()
+    # Species and individuals per survey with the survey day's weather joined on from the local climate table;
+    # redone only when a season's CSV or the climate table changes
+    return weather.attach(load_survey_matrix(signature).totals(), weather.read_climate())
 
 def main():
 
@@ -46,11 +50,9 @@ def main():
     # LOAD DATA
     # -------------------------
     try:
-        # Load the specific 2025 butterfly CSV
-        df = pd.read_csv("san_antonio_butterfly_counts_consolidated_2025.csv")
-        df.columns = df.columns.str.strip().str.upper()
-        df["DATE"] = pd.to_datetime(df["DATE"], errors="coerce")
-        df = df.dropna(subset=["DATE"])
+        with timing.stage("butterfly.load", cached=True) as t:
+            matrix = load_survey_matrix(butterfly_store.source_signature())
+            t["rows_out"] = int(matrix.counts.size)
     except Exception as e:
         st.error(f"Error loading CSV: {e}")
         return
@@ -61,30 +63,24 @@ def main():
     st.markdown("<hr>", unsafe_allow_html=True)
     st.markdown("<h2 style='text-align: center;'>📋 Select Specific Checklist</h2>", unsafe_allow_html=True)
     
-    # Get the unique dates (July 10 and Oct 15)
-    available_dates = sorted(df["DATE"].dt.date.unique(), reverse=True)
+    # Every survey across all loaded seasons, newest first
+    available_dates = matrix.survey_dates()[::-1]
     
-    # Dropdown to select between the two dates
+    # Dropdown to select a survey
     _, col_selector, _ = st.columns([2, 2, 2])
     with col_selector:
         selected_date = st.selectbox("Choose a survey date to view details:", available_dates)
 
     if selected_date:
-        # Filter sightings for the selected date only
-        checklist_df = df[df["DATE"].dt.date == selected_date].copy()
+        with timing.stage("butterfly.checklist") as t:
+            checklist_df = matrix.checklist(selected_date)
+            t["rows_out"] = len(checklist_df)
         
         # --- Summary Metrics for the Selected Date ---
         st.markdown(f"<h3 style='text-align: center;'>Summary for {selected_date}</h3>", unsafe_allow_html=True)
         
         m1, m2, m3 = st.columns(3)
-        spec_count = checklist_df["COMMON NAME"].nunique()
-        indiv_count = checklist_df["COUNT"].sum()
-        
-        # Calculate most frequent species for the metrics
-        if not checklist_df.empty:
-            top_bug = checklist_df.groupby("COMMON NAME")["COUNT"].sum().idxmax()
-        else:
-            top_bug = "N/A"
+        spec_count, indiv_count, top_bug = matrix.summary(selected_date)
 
         m1.metric("Species Found", spec_count)
         m2.metric("Total Individuals", int(indiv_count))
@@ -96,17 +92,39 @@ def main():
         
         with col_list:
             st.subheader(f"🦋 Butterfly List ({selected_date})")
-            display_list = checklist_df[["COMMON NAME", "SCIENTIFIC NAME", "COUNT"]].sort_values("COUNT", ascending=False)
-            st.dataframe(display_list, use_container_width=True, hide_index=True)
+            st.dataframe(checklist_df, use_container_width=True, hide_index=True)
             
         with col_weather:
             st.subheader("🌡️ Weather Conditions")
-            weather_data = fetch_weather_data(LATITUDE, LONGITUDE, selected_date)
-            if not weather_data.empty:
-                # Transpose the weather table so it looks like a list
-                st.table(weather_data.T.rename(columns={0: "Value"}))
+            if warmup.in_progress("weather"):
+                # Don't hold the page on the network while the background warm-up is fetching it
+                st.info("Weather is still loading in the background; it will appear on the next refresh.")
             else:
-                st.info("Weather data unavailable for this date.")
+                with timing.stage("butterfly.weather"):
+                    weather_data = fetch_weather_data(LATITUDE, LONGITUDE, [selected_date])
+                if not weather_data.empty:
+                    # Transpose the weather table so it looks like a list
+                    st.table(weather_data.reset_index(drop=True).T.rename(columns={0: "Value"}))
+                else:
+                    st.info("Weather data unavailable for this date.")
+
+    # -------------------------
+    # SURVEYS AT A GLANCE
+    # -------------------------
+    st.markdown("<br><hr>", unsafe_allow_html=True)
+    st.markdown("<h2 style='text-align: center;'>📈 Surveys at a Glance</h2>", unsafe_allow_html=True)
+    with timing.stage("butterfly.totals", cached=True) as t:
+        survey_totals = load_survey_totals(butterfly_store.source_signature(), weather.climate_signature())
+        t["rows_out"] = len(survey_totals)
+    st.line_chart(survey_totals.set_index("Date")[["Species Found", "Individuals"]])
+
+    # -------------------------
+    # WEATHER AND BUTTERFLIES
+    # -------------------------
+    st.markdown("<br><hr>", unsafe_allow_html=True)
+    st.markdown("<h2 style='text-align: center;'>🌦️ Weather and Butterflies</h2>", unsafe_allow_html=True)
+    abundance = st.radio("Measure", ["Individuals", "Species Found"], horizontal=True, key="butterfly_weather_value")
+    climate_views.weather_vs_abundance(survey_totals, abundance, key="butterfly_weather", event="survey")
 
     # -------------------------
     # COMPARISON SECTION
@@ -114,26 +132,33 @@ def main():
     st.markdown("<br><hr>", unsafe_allow_html=True)
     st.markdown("<h2 style='text-align: center;'>📊 Comparison Between Dates</h2>", unsafe_allow_html=True)
     
-    # Default to comparing the two available dates
-    if len(available_dates) >= 2:
-        date_a = available_dates[1] # July 10
-        date_b = available_dates[0] # Oct 15
-        
-        st.markdown(f"<p style='text-align: center;'>Comparing <b>{date_a}</b> (A) vs <b>{date_b}</b> (B)</p>", unsafe_allow_html=True)
-        
-        df_a = df[df["DATE"].dt.date == date_a].groupby("COMMON NAME")["COUNT"].sum()
-        df_b = df[df["DATE"].dt.date == date_b].groupby("COMMON NAME")["COUNT"].sum()
-        
-        comp_df = pd.DataFrame({
-            f"Count ({date_a})": df_a,
-            f"Count ({date_b})": df_b
-        }).fillna(0)
+    # Any set of surveys; defaults to the two most recent
+    compare_dates = st.multiselect(
+        "Choose surveys to compare:", available_dates, default=available_dates[:2]
+    )
+    
+    if len(compare_dates) >= 2:
+        compare_dates = sorted(compare_dates)
+        st.markdown(f"<p style='text-align: center;'>Comparing {len(compare_dates)} surveys: <b>{compare_dates[0]}</b> through <b>{compare_dates[-1]}</b> (Difference = last - first)</p>", unsafe_allow_html=True)
         
-        comp_df["Difference"] = comp_df[f"Count ({date_b})"] - comp_df[f"Count ({date_a})"]
+        with timing.stage("butterfly.compare", rows_in=len(compare_dates)) as t:
+            comp_df = matrix.compare(compare_dates)
+            t["rows_out"] = len(comp_df)
         
         _, cent_col, _ = st.columns([1, 6, 1])
         with cent_col:
-            st.dataframe(comp_df.sort_values("Difference", ascending=False), use_container_width=True)
+            st.dataframe(comp_df.sort_values("Difference", ascending=False), use_container_width=True, hide_index=True)
+
+            # Weather on every compared survey, from a single batched lookup
+            if not warmup.in_progress("weather"):
+                with timing.stage("butterfly.weather_compare", rows_in=len(compare_dates)):
+                    compare_weather = fetch_weather_data(LATITUDE, LONGITUDE, compare_dates)
+                if not compare_weather.empty:
+                    st.markdown("**🌡️ Weather on the compared surveys**")
+                    compare_weather.index = compare_weather.index.date
+                    st.dataframe(compare_weather, use_container_width=True)
+    else:
+        st.info("Select at least two surveys to compare.")
 
     # === Footer ===
     st.markdown("---")
@@ -1,7 +1,106 @@
 import streamlit as st
 import pandas as pd
 import requests
+import altair as alt
 import datetime
+import os
+import climate_views
+import data_index
+import paged_table
+import pheno_cube
+import rollups
+import shared_data
+import timing
+import warmup
+import weather
+
+# ============================================================
+# Constants
+# ============================================================
+LATITUDE = 29.4689
+LONGITUDE = -98.4798
+PHENO_DATA_FILE = "historical_pheno_data.csv"
+
+# ============================================================
+# Weather (shared on-disk store; only missing days hit Open-Meteo)
+# ============================================================
+def fetch_weather_data(lat, lon, start, end):
+    try:
+        return weather.get_daily(lat, lon, start, end)
+    except Exception as e:
+        st.error(f"Weather API error: {e}")
+        return pd.DataFrame(columns=weather.COLUMNS)
+
+def fetch_weather_dates(lat, lon, dates):
+    # One batched lookup for several scattered dates, indexed by date
+    try:
+        return weather.get_dates(lat, lon, dates)
+    except Exception as e:
+        st.error(f"Weather API error: {e}")
+        return pd.DataFrame(columns=weather.COLUMNS[1:], index=pd.DatetimeIndex([], name="Date"), dtype=float)
+
+# ============================================================
+# Load & Clean Phenology Data
+# ============================================================
+def current_pheno_version():
+    """Publish the data file as the shared dataset if it changed since; the version to load, None to read it in memory."""
+    if not os.path.exists(PHENO_DATA_FILE):
+        return None
+    try:
+        return shared_data.publish_pheno(PHENO_DATA_FILE)
+    except (OSError, ValueError) as e:
+        # Read-only deploys (and a file load_pheno_data reports on) fall back to reading the file per process
+        print(f"Warning: could not publish {PHENO_DATA_FILE}: {e}")
+        return None
+
+@st.cache_resource(max_entries=1)
+def load_pheno_data(version):
+    timing.cache_miss()
+    # One frame per process over the memory-mapped dataset, not a copy per session; a new version replaces it
+    try:
+        if version is not None:
+            df = shared_data.frame("pheno")
+        else:
+            df = weather.attach(shared_data.read_pheno(PHENO_DATA_FILE), weather.read_climate())
+    except FileNotFoundError:
+        st.error("Data file 'historical_pheno_data.csv' not found.")
+        return pd.DataFrame(), None, {}
+    except ValueError as e:
+        st.error(str(e))
+        return pd.DataFrame(), None, {}
+    name_index = {col: data_index.NameSearchIndex(df[col]) for col in ["Common Name", "Scientific Name"]}
+    return df, data_index.DateIndex(df["Date"]), name_index
+
+@st.cache_data
+def load_pheno_rollups(version):
+    timing.cache_miss()
+    # Day/week/month tables, rebuilt only when the data file changes
+    df, _, _ = load_pheno_data(version)
+    return rollups.pheno_rollups(df, PHENO_DATA_FILE)
+
+@st.cache_resource(max_entries=1)
+def load_count_cube(version):
+    timing.cache_miss()
+    # Read-only, so shared across sessions rather than copied per rerun
+    df, date_index, _ = load_pheno_data(version)
+    return pheno_cube.DateCountCube(df, date_index)
+
+def filter_observations(df, date_index, name_index, start_date, end_date, locations, categories,
+                        common_search="", scientific_search=""):
+    """Rows in the date range for the chosen locations/categories whose names contain the searches."""
+    filtered = df.iloc[date_index.range(start_date, end_date)]
+    # A filter with everything selected is left out
+    if len(locations) < len(df["Location"].cat.categories):
+        filtered = filtered[data_index.code_mask(filtered["Location"], locations)]
+    if len(categories) < len(df["Category"].cat.categories):
+        filtered = filtered[data_index.code_mask(filtered["Category"], categories)]
+
+    # Name searches run against the unique names once, then filter rows by category code
+    if common_search:
+        filtered = filtered[data_index.codes_mask(filtered["Common Name"], name_index["Common Name"].search(common_search))]
+    if scientific_search:
+        filtered = filtered[data_index.codes_mask(filtered["Scientific Name"], name_index["Scientific Name"].search(scientific_search))]
+    return filtered
 
 def main():
     # Removed set_page_config to avoid conflict with app.py
@@ -9,129 +108,35 @@ def main():
     st.markdown("<h1 style='text-align:center;'>🌿 Headwaters Phenology Dashboard 🌿</h1>", unsafe_allow_html=True)
     st.markdown("<h4 style='text-align:center;color:gray;'>Plants • Wildlife • Pollinators</h4>", unsafe_allow_html=True)
 
-    # ============================================================
-    # Constants
-    # ============================================================
-    LATITUDE = 29.4689
-    LONGITUDE = -98.4798
-
-    # ============================================================
-    # Helpers
-    # ============================================================
-    def to_date(x):
-        """Safely convert various date-like objects to a Python date."""
-        if isinstance(x, datetime.datetime):
-            return x.date()
-        if isinstance(x, datetime.date):
-            return x
-        return pd.to_datetime(x).date()
-
-    # ============================================================
-    # Weather API
-    # ============================================================
-    @st.cache_data(ttl=3600)
-    def fetch_weather_data(lat, lon, start, end):
-        start = to_date(start)
-        end = to_date(end)
-
-        url = "https://archive-api.open-meteo.com/v1/archive"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "start_date": start.strftime("%Y-%m-%d"),
-            "end_date": end.strftime("%Y-%m-%d"),
-            "daily": ["temperature_2m_max", "temperature_2m_min", "precipitation_sum"],
-            "timezone": "America/Chicago"
-        }
-
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            df_weather = pd.DataFrame({
-                "Date": pd.to_datetime(data.get("daily", {}).get("time", [])),
-                "temp_max": [(t * 9/5 + 32) if t is not None else None for t in data.get("daily", {}).get("temperature_2m_max", [])],
-                "temp_min": [(t * 9/5 + 32) if t is not None else None for t in data.get("daily", {}).get("temperature_2m_min", [])],
-                "precipitation": [(p * 0.0393701) if p is not None else None for p in data.get("daily", {}).get("precipitation_sum", [])]
-            })
-            return df_weather
-        except Exception as e:
-            st.error(f"Weather API error: {e}")
-            return pd.DataFrame(columns=["Date", "temp_max", "temp_min", "precipitation"])
-
-    # ============================================================
-    # Load & Clean Phenology Data
-    # ============================================================
-    @st.cache_data
-    def load_pheno_data():
-        try:
-            df_raw = pd.read_csv(
-                "historical_pheno_data.csv",
-                encoding="utf-8",
-                sep="\t",  # 👈 THIS is the fix
-                on_bad_lines="skip"
-            )
-
-            # Normalize column names
-            df_raw.columns = (
-                df_raw.columns
-                .str.strip()
-                .str.upper()
-                .str.replace('\ufeff', '', regex=False)  # remove BOM if present
-            )
-
-            # Drop junk Excel columns like "Unnamed: 8"
-            df_raw = df_raw.loc[:, ~df_raw.columns.str.contains('^UNNAMED', case=False)]
-
-            required = ["OBSERVATIONDATETIME", "LOCATION", "WEDGE", "CATEGORY",
-                        "COMMONNAME", "SCIENTIFICNAME", "STATUS", "NOTES"]
-
-            missing = [c for c in required if c not in df_raw.columns]
-
-            if missing:
-                st.error(f"Missing required columns: {missing}")
-                st.write("Columns found:", df_raw.columns.tolist())  # debug visibility
-                return pd.DataFrame()
-
-            df_raw["OBSERVATIONDATETIME"] = pd.to_datetime(df_raw["OBSERVATIONDATETIME"], errors="coerce")
-            df_raw = df_raw.dropna(subset=["OBSERVATIONDATETIME"])
-
-            df_raw = df_raw.rename(columns={
-                "OBSERVATIONDATETIME": "Date",
-                "COMMONNAME": "Common Name",
-                "SCIENTIFICNAME": "Scientific Name",
-                "CATEGORY": "Category",
-                "LOCATION": "Location",
-                "STATUS": "Status",
-                "NOTES": "Notes",
-                "WEDGE": "Wedge"
-            })
-            return df_raw
-        except FileNotFoundError:
-            st.error("Data file 'historical_pheno_data.csv' not found.")
-            return pd.DataFrame()
-
     # ============================================================
     # Page Logic
     # ============================================================
-    df = load_pheno_data()
+    with timing.stage("phenology.load", cached=True) as t:
+        version = current_pheno_version()
+        df, date_index, name_index = load_pheno_data(version)
+        t["rows_out"] = len(df)
     if df.empty:
         st.warning("No data available to display.")
         st.stop()
 
-    MIN_DATE = df["Date"].min().date()
-    MAX_DATE = df["Date"].max().date()
+    MIN_DATE = df["Date"].iloc[0].date()
+    MAX_DATE = df["Date"].iloc[-1].date()
 
     st.subheader("🆕 Latest Observations")
-    latest_date = df["Date"].max()
-    latest_df = df[df["Date"] == latest_date].copy()
+    latest_date = df["Date"].iloc[-1]
+    latest_df = df.iloc[date_index.day(latest_date)]
 
     st.write(f"**Latest observation date:** {latest_date.strftime('%Y-%m-%d')}")
     st.dataframe(latest_df[["Location", "Category", "Common Name", "Scientific Name", "Status", "Notes", "Wedge"]], 
                  hide_index=True, use_container_width=True)
 
-    weather_latest = fetch_weather_data(LATITUDE, LONGITUDE, latest_date, latest_date)
+    # Don't hold the page on the network while the background warm-up is fetching weather
+    weather_pending = warmup.in_progress("weather")
+    if weather_pending:
+        weather_latest = pd.DataFrame(columns=weather.COLUMNS)
+    else:
+        with timing.stage("phenology.weather_latest"):
+            weather_latest = fetch_weather_data(LATITUDE, LONGITUDE, latest_date, latest_date)
     if not weather_latest.dropna(subset=["temp_max", "temp_min"]).empty:
         st.subheader(f"Weather for {latest_date.date()}")
         display_latest_weather = weather_latest.copy()
@@ -149,38 +154,79 @@ def main():
         end_date = st.date_input("End Date", MAX_DATE)
 
     st.subheader("🏞️ Filter by Location")
-    locations = sorted(df["Location"].dropna().unique())
+    locations = list(df["Location"].cat.categories)
     selected_locations = st.multiselect("Choose locations:", locations, default=locations)
 
     st.subheader("🌱 Filter by Category")
-    categories = sorted(df["Category"].dropna().unique())
+    categories = list(df["Category"].cat.categories)
     selected_categories = st.multiselect("Choose categories:", categories, default=categories)
 
     st.subheader("🔍 Filter by Name")
     common_search = st.text_input("Search Common Name")
     scientific_search = st.text_input("Search Scientific Name")
 
-    filtered = df[
-        (df["Date"] >= pd.to_datetime(start_date)) &
-        (df["Date"] <= pd.to_datetime(end_date)) &
-        (df["Location"].isin(selected_locations)) &
-        (df["Category"].isin(selected_categories))
-    ].copy()
-
-    if common_search:
-        filtered = filtered[filtered["Common Name"].str.contains(common_search, case=False, na=False)]
-    if scientific_search:
-        filtered = filtered[filtered["Scientific Name"].str.contains(scientific_search, case=False, na=False)]
-
-    sort_col = st.selectbox("Sort by", ["Date", "Location", "Category", "Common Name", "Scientific Name"])
-    sort_order = st.radio("Order", ["Ascending", "Descending"], horizontal=True)
-    filtered = filtered.sort_values(sort_col, ascending=(sort_order == "Ascending"))
-
-    st.dataframe(filtered[["Date", "Location", "Category", "Common Name", "Scientific Name", "Status", "Notes", "Wedge"]],
-                 hide_index=True, use_container_width=True)
+    with timing.stage("phenology.filter", rows_in=len(df)) as t:
+        filtered = filter_observations(df, date_index, name_index, start_date, end_date,
+                                       selected_locations, selected_categories, common_search, scientific_search)
+        t["rows_out"] = len(filtered)
+
+    with timing.stage("phenology.render", rows_in=len(filtered)) as t:
+        # Sorted and paged server-side; only the current page goes to the browser
+        t["rows_out"] = paged_table.paged_table(
+            filtered, key="pheno_filtered",
+            columns=["Date", "Location", "Category", "Common Name", "Scientific Name", "Status", "Notes", "Wedge"],
+            sort_columns=["Date", "Location", "Category", "Common Name", "Scientific Name"],
+            file_name="phenology_observations.csv"
+        )
+
+    st.subheader("📈 Observations Over Time")
+    grain = st.radio("Group by", rollups.GRAINS, index=1, horizontal=True, format_func=str.title)
+    with timing.stage("phenology.activity", cached=True) as t:
+        # Periods overlapping the date range, for the chosen locations and categories, from the pre-aggregated totals
+        totals = load_pheno_rollups(version)["totals"][grain]
+        totals = totals[
+            totals["Date"].between(rollups.period_start([start_date], grain).iloc[0], pd.Timestamp(end_date))
+            & totals["Location"].isin(selected_locations)
+            & totals["Category"].isin(selected_categories)
+        ]
+        activity = totals.groupby(["Date", "Category"], observed=True)["Observations"].sum().reset_index()
+        t["rows_out"] = len(activity)
+    if activity.empty:
+        st.info("No observations for the selected range, locations and categories.")
+    else:
+        st.altair_chart(
+            alt.Chart(activity).mark_bar().encode(
+                x=alt.X("Date:T", title=grain.title()),
+                y=alt.Y("Observations:Q", stack=True),
+                color="Category:N",
+                tooltip=[alt.Tooltip("Date:T"), "Category", "Observations"]
+            ),
+            use_container_width=True
+        )
+
+    st.subheader("🌦️ Weather and Observations")
+    st.caption("Observations on each survey day in the range, against that day's weather from the local climate table.")
+    with timing.stage("phenology.weather_abundance") as t:
+        in_range = df.iloc[date_index.range(start_date, end_date)]
+        in_range = in_range[data_index.code_mask(in_range["Location"], selected_locations)
+                            & data_index.code_mask(in_range["Category"], selected_categories)]
+        # Weather was joined on per row at ingest and is the same for every row of a day
+        survey_days = (
+            in_range.assign(Date=in_range["Date"].dt.normalize())
+            .groupby(["Location", "Date"], observed=True)
+            .agg(Observations=("Common Name", "size"), **{col: (col, "first") for col in weather.ATTACHED_COLUMNS})
+            .reset_index()
+        )
+        t["rows_out"] = len(survey_days)
+    climate_views.weather_vs_abundance(survey_days, "Observations", key="pheno_weather", event="survey day")
 
     st.subheader("🌡️ Weather for Filtered Range")
-    weather_range = fetch_weather_data(LATITUDE, LONGITUDE, start_date, end_date)
+    if weather_pending:
+        st.caption("Weather is still loading in the background; it will appear on the next refresh.")
+        weather_range = pd.DataFrame(columns=weather.COLUMNS)
+    else:
+        with timing.stage("phenology.weather_range"):
+            weather_range = fetch_weather_data(LATITUDE, LONGITUDE, start_date, end_date)
     weather_range = weather_range.dropna(subset=["temp_max", "temp_min"])
 
     if not weather_range.empty:
@@ -201,7 +247,7 @@ def main():
 
     st.markdown("---")
     st.subheader("📝 Compare Specific Dates")
-    unique_dates = sorted(df["Date"].dt.date.unique(), reverse=True)
+    unique_dates = date_index.unique_dates()[::-1]
     colA, colB = st.columns(2)
     with colA:
         dateA = st.selectbox("Select Date A", unique_dates)
@@ -212,22 +258,18 @@ def main():
     sort_compare_order = st.radio("Comparison order", ["Ascending", "Descending"], horizontal=True)
 
     if st.button("Compare Dates"):
-        dfA = df[(df["Date"].dt.date == dateA) & (df["Location"].isin(selected_locations)) & (df["Category"].isin(selected_categories))]
-        dfB = df[(df["Date"].dt.date == dateB) & (df["Location"].isin(selected_locations)) & (df["Category"].isin(selected_categories))]
-
-        merged = pd.merge(
-            dfA.groupby(["Location", "Category", "Common Name", "Scientific Name"]).size().reset_index(name="Count A"),
-            dfB.groupby(["Location", "Category", "Common Name", "Scientific Name"]).size().reset_index(name="Count B"),
-            on=["Location", "Category", "Common Name", "Scientific Name"], how="outer"
-        ).fillna(0)
-
-        merged["Difference"] = merged["Count B"] - merged["Count A"]
+        # Two lookups into the pre-aggregated count cube, aligned by cell and subtracted
+        with timing.stage("phenology.compare_dates", cached=True) as t:
+            merged = load_count_cube(version).compare(dateA, dateB, selected_locations, selected_categories)
+            t["rows_out"] = len(merged)
         merged = merged.sort_values(sort_compare, ascending=(sort_compare_order == "Ascending"))
         st.dataframe(merged, hide_index=True, use_container_width=True)
 
         st.subheader("🌡️ Weather Comparison")
-        w_a = fetch_weather_data(LATITUDE, LONGITUDE, dateA, dateA)
-        w_b = fetch_weather_data(LATITUDE, LONGITUDE, dateB, dateB)
+        with timing.stage("phenology.weather_compare", rows_in=2):
+            weather_ab = fetch_weather_dates(LATITUDE, LONGITUDE, [dateA, dateB])
+        w_a = weather_ab.reindex(pd.DatetimeIndex([pd.Timestamp(dateA)], name="Date")).reset_index()
+        w_b = weather_ab.reindex(pd.DatetimeIndex([pd.Timestamp(dateB)], name="Date")).reset_index()
         
         st.write("**Date A Weather**")
         st.dataframe(w_a.rename(columns={"temp_max": "Max Temp °F", "temp_min": "Min Temp °F"}), hide_index=True)
@@ -245,9 +287,23 @@ def main():
         r2_e = st.date_input("Range 2 End", MAX_DATE, key="r2e")
 
     if st.button("Compare Ranges"):
-        rangeA = df[(df["Date"] >= pd.to_datetime(r1_s)) & (df["Date"] <= pd.to_datetime(r1_e))]
-        rangeB = df[(df["Date"] >= pd.to_datetime(r2_s)) & (df["Date"] <= pd.to_datetime(r2_e))]
-        st.info("Range comparison logic executed.")
+        # Range totals come from the cube's running per-cell totals: two binary searches per range
+        with timing.stage("phenology.compare_ranges", cached=True) as t:
+            range_compare, days_1, days_2 = load_count_cube(version).compare_ranges(
+                (r1_s, r1_e), (r2_s, r2_e), selected_locations, selected_categories
+            )
+            t["rows_out"] = len(range_compare)
+        mc1, mc2 = st.columns(2)
+        mc1.metric(f"Range 1: {r1_s} to {r1_e}", f"{int(range_compare['Range 1 Count'].sum())} observations",
+                   f"{days_1} survey days", delta_color="off")
+        mc2.metric(f"Range 2: {r2_s} to {r2_e}", f"{int(range_compare['Range 2 Count'].sum())} observations",
+                   f"{days_2} survey days", delta_color="off")
+        if range_compare.empty:
+            st.info("No observations in either range for the selected locations and categories.")
+        else:
+            range_compare = range_compare.sort_values(["Difference", sort_compare],
+                                                      ascending=[False, sort_compare_order == "Ascending"])
+            st.dataframe(range_compare, hide_index=True, use_container_width=True)
 
     st.markdown("---")
     st.markdown("<div style='text-align:center;color:gray;'>Headwaters Phenology Dashboard • Built with ❤️ by Brooke 🌿</div>", unsafe_allow_html=True)
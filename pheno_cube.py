@@ -0,0 +1,144 @@
+"""
+Pre-aggregated observation counts for the phenology comparisons.
+
+Built once per data load from the date-sorted phenology frame. Every
+(location, category, common name, scientific name) combination seen in the
+data is a "cell" with an integer id, and the counts are stored sparsely per
+observation day: for day d, cell_ids[ptr[d]:ptr[d + 1]] are the cells
+observed that day (ascending) and counts[...] how many rows each had.
+
+For date ranges the cube also keeps the same entries in cell-major order
+with a running total (built on first use), so any range's per-cell totals
+are two binary searches and a subtraction, whatever its length, in memory
+proportional to the entries rather than days x cells.
+"""
+import numpy as np
+import pandas as pd
+from functools import cached_property
+from data_index import day_number
+
+KEYS = ["Location", "Category", "Common Name", "Scientific Name"]
+
+class DateCountCube:
+    def __init__(self, df, date_index):
+        codes = np.column_stack([df[key].cat.codes.to_numpy() for key in KEYS]).astype(np.int64)
+        # Rows missing any key are left out, as groupby leaves out NaN keys
+        valid = (codes >= 0).all(axis=1)
+        codes = codes[valid]
+        row_days = date_index.days[valid]
+
+        self.categories = [df[key].cat.categories for key in KEYS]
+        self.cells, cell_of_row = np.unique(codes, axis=0, return_inverse=True)
+        cell_of_row = cell_of_row.reshape(-1)
+        self.days = np.unique(row_days)
+
+        n_cells = max(len(self.cells), 1)
+        flat = np.searchsorted(self.days, row_days) * n_cells + cell_of_row
+        flat, counts = np.unique(flat, return_counts=True)
+        self.cell_ids = flat % n_cells
+        self.counts = counts.astype(np.int64)
+        self.ptr = np.searchsorted(flat // n_cells, np.arange(len(self.days) + 1))
+
+    @cached_property
+    def cumulative(self):
+        """
+        (keys, totals): the day entries ordered by cell then day, keyed
+        cell * days + day, and totals[i] = rows in the first i of them. A
+        cell's count over days [lo, hi) is totals[p(hi)] - totals[p(lo)],
+        p(x) being where cell * days + x falls in keys.
+        """
+        day_of_entry = np.repeat(np.arange(len(self.days)), np.diff(self.ptr))
+        keys = self.cell_ids * len(self.days) + day_of_entry
+        order = np.argsort(keys, kind="stable")
+        totals = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(self.counts[order], out=totals[1:])
+        return keys[order], totals
+
+    def totals_before(self, position):
+        """Per-cell rows on the observation days before self.days[position]."""
+        keys, totals = self.cumulative
+        cell_keys = np.arange(len(self.cells), dtype=np.int64) * len(self.days)
+        return totals[np.searchsorted(keys, cell_keys + position)] - totals[np.searchsorted(keys, cell_keys)]
+
+    def day_span(self, start, end):
+        """[lo, hi) positions in self.days covering start..end inclusive."""
+        lo = np.searchsorted(self.days, day_number(start), side="left")
+        hi = np.searchsorted(self.days, day_number(end), side="right")
+        return int(lo), int(max(lo, hi))
+
+    def range_totals(self, start, end):
+        """Per-cell row totals over start..end inclusive, and the number of observation days in it."""
+        lo, hi = self.day_span(start, end)
+        return self.totals_before(hi) - self.totals_before(lo), hi - lo
+
+    def compare_ranges(self, range_a, range_b, locations=None, categories=None):
+        """
+        Per-cell totals for two (start, end) date ranges and their difference
+        (B - A), over cells seen in either range. Also returns the number of
+        observation days in each range.
+        """
+        totals_a, days_a = self.range_totals(*range_a)
+        totals_b, days_b = self.range_totals(*range_b)
+        keep = self.cell_mask(locations, categories) & ((totals_a > 0) | (totals_b > 0))
+        cells = np.flatnonzero(keep)
+        result = self.frame(cells, {
+            "Range 1 Count": totals_a[cells],
+            "Range 2 Count": totals_b[cells],
+            "Difference": totals_b[cells] - totals_a[cells]
+        })
+        return result, days_a, days_b
+
+    def day_position(self, day):
+        """Position of an observation day in self.days, or None if nothing was observed that day."""
+        day = day_number(day)
+        pos = np.searchsorted(self.days, day)
+        if pos < len(self.days) and self.days[pos] == day:
+            return int(pos)
+        return None
+
+    def counts_on(self, day):
+        """(cell ids, counts) observed on one day."""
+        pos = self.day_position(day)
+        if pos is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        lo, hi = self.ptr[pos], self.ptr[pos + 1]
+        return self.cell_ids[lo:hi], self.counts[lo:hi]
+
+    def cell_mask(self, locations=None, categories=None):
+        """Boolean mask over cells in the selected locations and categories (None = all)."""
+        mask = np.ones(len(self.cells), dtype=bool)
+        for column, selected in ((0, locations), (1, categories)):
+            if selected is None:
+                continue
+            wanted = self.categories[column].get_indexer(pd.Index(list(selected)))
+            table = np.zeros(len(self.categories[column]), dtype=bool)
+            table[wanted[wanted >= 0]] = True
+            mask &= table[self.cells[:, column]]
+        return mask
+
+    def frame(self, cell_ids, columns):
+        """Label cells with their key values and attach the given count columns."""
+        labels = {
+            key: pd.Categorical.from_codes(self.cells[cell_ids, i], categories=self.categories[i])
+            for i, key in enumerate(KEYS)
+        }
+        return pd.DataFrame({**labels, **columns})
+
+    def compare(self, day_a, day_b, locations=None, categories=None):
+        """Per-cell counts on two days and their difference (B - A), over the union of cells seen on either."""
+        cells_a, counts_a = self.counts_on(day_a)
+        cells_b, counts_b = self.counts_on(day_b)
+        cells = np.union1d(cells_a, cells_b)
+        cells = cells[self.cell_mask(locations, categories)[cells]]
+        # Both day segments are sorted by cell id, so they scatter straight into the aligned vectors
+        count_a = np.zeros(len(cells), dtype=np.int64)
+        count_b = np.zeros(len(cells), dtype=np.int64)
+        keep_a = np.isin(cells_a, cells)
+        keep_b = np.isin(cells_b, cells)
+        count_a[np.searchsorted(cells, cells_a[keep_a])] = counts_a[keep_a]
+        count_b[np.searchsorted(cells, cells_b[keep_b])] = counts_b[keep_b]
+        return self.frame(cells, {
+            "Count A": count_a,
+            "Count B": count_b,
+            "Difference": count_b - count_a
+        })
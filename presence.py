@@ -0,0 +1,109 @@
+"""
+Species x checklist presence for the eBird frequency and seasonality charts.
+
+Built once per data load from the store. Checklists are the sampling events
+of ebird_model.checklist_ids(). Presence is bit-packed along the checklist axis, and the
+per-species counts of reporting checklists are rolled up by week of year
+and by year alongside the checklist totals, so bar-chart frequencies
+("share of checklists reporting the species") are a division of two small
+arrays. Questions about a set of species ("any of these") OR their bit rows.
+"""
+import numpy as np
+import pandas as pd
+import ebird_model
+
+WEEKS = 52
+COLUMNS = ebird_model.CHECKLIST_COLUMNS + ebird_model.EFFORT_COLUMNS + ["Species", "Present"]
+
+def week_of_year(days):
+    """0-based week of year (0..51) for day numbers; the last day or two fold into week 51."""
+    dates = np.asarray(days).astype("datetime64[D]")
+    day_of_year = (dates - dates.astype("datetime64[Y]")).astype(np.int64)
+    return np.minimum(day_of_year // 7, WEEKS - 1)
+
+class PresenceMatrix:
+    def __init__(self, df):
+        days = df["Date"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+        checklist_of_row, first = ebird_model.checklist_ids(df)
+        checklist_of_row = checklist_of_row.astype(np.int64)
+        self.n_checklists = len(first)
+        self.checklist_days = days[first]
+        self.checklist_week = week_of_year(self.checklist_days)
+        self.checklist_year = self.checklist_days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+
+        self.species = df["Species"].cat.categories
+        species_of_row = df["Species"].cat.codes.to_numpy().astype(np.int64)
+        reported = df["Present"].to_numpy(dtype=bool) & (species_of_row >= 0)
+        # One entry per (species, checklist), however many rows reported it
+        pairs = np.unique(species_of_row[reported] * max(self.n_checklists, 1) + checklist_of_row[reported])
+        species_ids, checklist_ids = np.divmod(pairs, max(self.n_checklists, 1))
+
+        # Same bit order as np.packbits: checklist c is bit 7 - c % 8 of byte c // 8
+        self.bits = np.zeros((len(self.species), (self.n_checklists + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(self.bits, (species_ids, checklist_ids >> 3), (128 >> (checklist_ids & 7)).astype(np.uint8))
+
+        self.week_totals = np.bincount(self.checklist_week, minlength=WEEKS)
+        self.week_counts = np.zeros((len(self.species), WEEKS), dtype=np.int32)
+        np.add.at(self.week_counts, (species_ids, self.checklist_week[checklist_ids]), 1)
+
+        self.years, year_of_checklist = np.unique(self.checklist_year, return_inverse=True)
+        self.checklist_year_pos = year_of_checklist.reshape(-1)
+        self.year_totals = np.bincount(self.checklist_year_pos, minlength=len(self.years))
+        self.year_counts = np.zeros((len(self.species), len(self.years)), dtype=np.int32)
+        np.add.at(self.year_counts, (species_ids, self.checklist_year_pos[checklist_ids]), 1)
+
+    def codes(self, names):
+        codes = self.species.get_indexer(pd.Index(list(names)))
+        return codes[codes >= 0]
+
+    def overall_frequency(self):
+        """Share of all checklists reporting each species, most frequent first."""
+        counts = self.week_counts.sum(axis=1)
+        return pd.Series(counts / max(self.n_checklists, 1), index=self.species).sort_values(ascending=False, kind="mergesort")
+
+    def weekly_frequency(self, names):
+        """Week of year (1-52) x species: share of that week's checklists reporting the species."""
+        codes = self.codes(names)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            freq = self.week_counts[codes].T / self.week_totals[:, None]
+        return pd.DataFrame(freq, index=pd.RangeIndex(1, WEEKS + 1, name="Week"), columns=self.species[codes])
+
+    def yearly_frequency(self, names):
+        """Year x species: share of that year's checklists reporting the species."""
+        codes = self.codes(names)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            freq = self.year_counts[codes].T / self.year_totals[:, None]
+        return pd.DataFrame(freq, index=pd.Index(self.years, name="Year"), columns=self.species[codes])
+
+    def any_of(self, names):
+        """Boolean per checklist: did it report any of the given species?"""
+        codes = self.codes(names)
+        if not len(codes):
+            return np.zeros(self.n_checklists, dtype=bool)
+        return np.unpackbits(np.bitwise_or.reduce(self.bits[codes], axis=0), count=self.n_checklists).astype(bool)
+
+    def group_frequency(self, names, by="week"):
+        """Share of checklists reporting any of the given species, per week of year or per year."""
+        hit = self.any_of(names)
+        if by == "week":
+            counts = np.bincount(self.checklist_week[hit], minlength=WEEKS)
+            index, totals = pd.RangeIndex(1, WEEKS + 1, name="Week"), self.week_totals
+        else:
+            counts = np.bincount(self.checklist_year_pos[hit], minlength=len(self.years))
+            index, totals = pd.Index(self.years, name="Year"), self.year_totals
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.Series(counts / totals, index=index, name="Frequency")
+
+    def expected(self, day, min_frequency=0.1, window=1):
+        """
+        Species reported on at least min_frequency of the checklists in the
+        week of `day` (plus `window` weeks either side, wrapping over new year),
+        most frequent first.
+        """
+        week = int(week_of_year(np.datetime64(pd.Timestamp(day).date(), "D")))
+        weeks = [(week + offset) % WEEKS for offset in range(-window, window + 1)]
+        total = self.week_totals[weeks].sum()
+        if not total:
+            return pd.Series(dtype=float, name="Frequency")
+        freq = pd.Series(self.week_counts[:, weeks].sum(axis=1) / total, index=self.species, name="Frequency")
+        return freq[freq >= min_frequency].sort_values(ascending=False, kind="mergesort")
@@ -0,0 +1,210 @@
+"""
+Materialized day / ISO week / month rollups of the eBird and phenology data.
+
+The ingest steps write them next to the data they summarize, so summary
+views and charts read a few hundred pre-aggregated rows instead of the full
+history. Each dataset has two tables:
+    species: counts per species (eBird: per location; phenology: per
+             location and category) and period
+    totals:  checklist / survey totals per location (and category) and period
+Every value column is additive, so the week and month tables are sums of the
+day table, and only the days touched by new data are ever recomputed.
+
+eBird rollups are updated incrementally: the sidecar records which store
+partitions they already include, and update_ebird() recomputes just the days
+the new partitions touch. build_csv.py writes the phenology CSV whole, so
+its rollups are rebuilt from the merged frame it already holds.
+"""
+import json
+from pathlib import Path
+import pandas as pd
+import pyarrow.dataset as ds
+import ebird_model
+import ebird_store
+
+# === Constants ===
+SCHEMA_VERSION = 2
+ROLLUP_DIR = ebird_store.DATA_DIR / "rollups"
+GRAINS = ["day", "week", "month"]
+
+# Key columns of each table; every other column is an additive count
+KEYS = {
+    "ebird": {"species": ["Location ID", "Species"], "totals": ["Location ID"]},
+    "pheno": {"species": ["Location", "Category", "Common Name"], "totals": ["Location", "Category"]}
+}
+# Store columns the eBird rollups are computed from
+EBIRD_COLUMNS = ebird_model.CHECKLIST_COLUMNS + ebird_model.EFFORT_COLUMNS + ["Species", "Count", "Present"]
+
+# === Aggregation ===
+def period_start(dates, grain):
+    """First day of the day / ISO week (Monday) / month each date falls in."""
+    dates = pd.to_datetime(pd.Series(dates)).dt.normalize()
+    if grain == "day":
+        return dates
+    if grain == "week":
+        return dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+    if grain == "month":
+        return dates.dt.to_period("M").dt.to_timestamp()
+    raise ValueError(f"Unknown grain {grain!r}; expected one of {GRAINS}")
+
+def roll_up(daily, keys, grain):
+    """Sum a day table into weeks or months."""
+    if grain == "day":
+        return daily
+    periods = daily.assign(Date=period_start(daily["Date"], grain).to_numpy())
+    return periods.groupby(keys + ["Date"], observed=True, sort=True).sum().reset_index()
+
+def ebird_daily(df):
+    """
+    Day tables from store rows. Checklists are the sampling events of
+    ebird_model.checklist_ids().
+    """
+    if df.empty:
+        return {
+            "species": pd.DataFrame(columns=KEYS["ebird"]["species"] + ["Date", "Count", "Checklists"]),
+            "totals": pd.DataFrame(columns=KEYS["ebird"]["totals"] + ["Date", "Checklists", "Observations", "Days"])
+        }
+    df = df.assign(Date=df["Date"].dt.normalize(), Visit=ebird_model.checklist_ids(df)[0], Count=df["Count"].fillna(0).astype("int64"))
+    species = (
+        df[df["Present"]]
+        .groupby(["Location ID", "Species", "Date"], observed=True, sort=True)
+        .agg(Count=("Count", "sum"), Checklists=("Visit", "nunique"))
+        .reset_index()
+    )
+    totals = (
+        df.groupby(["Location ID", "Date"], observed=True, sort=True)
+        .agg(Checklists=("Visit", "nunique"), Observations=("Species", "size"))
+        .reset_index()
+        .assign(Days=1)
+    )
+    return {"species": species, "totals": totals}
+
+def pheno_daily(df):
+    """Day tables from phenology rows (dashboard column names): observations per name, and survey days."""
+    df = df.assign(Date=pd.to_datetime(df["Date"], errors="coerce").dt.normalize()).dropna(subset=["Date"])
+    keys = KEYS["pheno"]
+    species = df.groupby(keys["species"] + ["Date"], observed=True, sort=True).size().reset_index(name="Observations")
+    totals = df.groupby(keys["totals"] + ["Date"], observed=True, sort=True).size().reset_index(name="Observations").assign(Days=1)
+    return {"species": species, "totals": totals}
+
+def _normalize(df, keys):
+    # Key columns stay categorical whatever dictionaries the pieces came with
+    df = df.copy()
+    for col in keys:
+        df[col] = df[col].astype("string").astype("category")
+    df["Date"] = pd.to_datetime(df["Date"]).astype("datetime64[ns]")
+    return df.sort_values(keys + ["Date"], kind="mergesort").reset_index(drop=True)
+
+def materialize(name, daily):
+    """{table: {grain: frame}} from the day tables."""
+    tables = {}
+    for table, frame in daily.items():
+        keys = KEYS[name][table]
+        frame = _normalize(frame, keys)
+        tables[table] = {grain: roll_up(frame, keys, grain) for grain in GRAINS}
+    return tables
+
+# === Storage ===
+# Layout: ROLLUP_DIR/<name>_<table>_<grain>.parquet plus <name>_meta.json.
+# The sidecar is replaced last, as in ebird_store.
+def table_path(name, table, grain, directory=ROLLUP_DIR):
+    return Path(directory) / f"{name}_{table}_{grain}.parquet"
+
+def meta_path(name, directory=ROLLUP_DIR):
+    return Path(directory) / f"{name}_meta.json"
+
+def read_meta(name, directory=ROLLUP_DIR):
+    path = meta_path(name, directory)
+    if not path.exists():
+        return None
+    try:
+        with open(path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("schema_version") == SCHEMA_VERSION else None
+
+def write(name, daily, meta, directory=ROLLUP_DIR):
+    """Write every table at every grain, then the sidecar. Returns {table: {grain: frame}}."""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    tables = materialize(name, daily)
+    for table, grains in tables.items():
+        for grain, frame in grains.items():
+            path = table_path(name, table, grain, directory)
+            tmp_file = path.with_suffix(".parquet.tmp")
+            frame.to_parquet(tmp_file, index=False)
+            tmp_file.replace(path)
+    path = meta_path(name, directory)
+    tmp_file = path.with_suffix(".json.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump({**meta, "schema_version": SCHEMA_VERSION}, f, indent=2)
+    tmp_file.replace(path)
+    return tables
+
+def read(name, table, grain, directory=ROLLUP_DIR):
+    return pd.read_parquet(table_path(name, table, grain, directory))
+
+def read_all(name, directory=ROLLUP_DIR):
+    return {table: {grain: read(name, table, grain, directory) for grain in GRAINS} for table in KEYS[name]}
+
+# === eBird ===
+def update_ebird(directory=ROLLUP_DIR):
+    """
+    Bring the eBird rollups up to date with the store. Only partitions they
+    have not seen are read, and only the days those touch are recomputed; a
+    rebuilt or compacted store (partitions gone) starts them over.
+    Returns the number of days recomputed.
+    """
+    store_meta = ebird_store.read_meta()
+    if store_meta is None:
+        return 0
+    partitions = [p["file"] for p in store_meta["partitions"]]
+    meta = read_meta("ebird", directory)
+    if meta is None or not set(meta["partitions"]) <= set(partitions):
+        tables = write("ebird", ebird_daily(ebird_store.read_store(EBIRD_COLUMNS)), {"partitions": partitions}, directory)
+        return tables["totals"]["day"]["Date"].nunique()
+    new = [p for p in partitions if p not in set(meta["partitions"])]
+    if not new:
+        return 0
+
+    # Late checklists can add to a day the rollups already hold, so touched days are recomputed whole
+    new_dates = ds.dataset([str(ebird_store.STORE_DIR / p) for p in new], format="parquet").to_table(columns=["Date"])
+    days = pd.Series(new_dates.column("Date").to_pandas()).dt.normalize().drop_duplicates()
+    rows = ebird_store.read_store(EBIRD_COLUMNS, filter=ds.field("Date").isin(days.to_numpy(dtype="datetime64[ns]")))
+    fresh = ebird_daily(rows)
+    daily = {}
+    for table, frame in fresh.items():
+        old = read("ebird", table, "day", directory)
+        as_strings = {col: "string" for col in KEYS["ebird"][table]}
+        daily[table] = pd.concat([old[~old["Date"].isin(days)].astype(as_strings), frame.astype(as_strings)], ignore_index=True)
+    write("ebird", daily, {"partitions": partitions}, directory)
+    return len(days)
+
+def ebird_rollups(directory=ROLLUP_DIR):
+    """{table: {grain: frame}} for the dashboard, updating the files first where they can be written."""
+    try:
+        update_ebird(directory)
+    except OSError as e:
+        # Read-only deploys aggregate in memory instead
+        print(f"Warning: could not write {directory}: {e}")
+        return materialize("ebird", ebird_daily(ebird_store.read_store(EBIRD_COLUMNS)))
+    if read_meta("ebird", directory) is None:
+        return materialize("ebird", ebird_daily(ebird_store.read_store(EBIRD_COLUMNS)))
+    return read_all("ebird", directory)
+
+# === Phenology ===
+def update_pheno(df, csv_path, directory=ROLLUP_DIR):
+    """Rebuild the phenology rollups from df (the rows of csv_path) unless they already match that file. Returns the tables."""
+    source = ebird_store.source_fingerprint(csv_path)
+    meta = read_meta("pheno", directory)
+    if meta is not None and meta.get("source") == source:
+        return read_all("pheno", directory)
+    return write("pheno", pheno_daily(df), {"source": source}, directory)
+
+def pheno_rollups(df, csv_path, directory=ROLLUP_DIR):
+    """{table: {grain: frame}} for the dashboard's copy of the phenology data."""
+    try:
+        return update_pheno(df, csv_path, directory)
+    except OSError as e:
+        print(f"Warning: could not write {directory}: {e}")
+        return materialize("pheno", pheno_daily(df))
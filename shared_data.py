@@ -0,0 +1,215 @@
+"""
+Read-only shared datasets: Arrow IPC files memory-mapped by every session
+and worker process.
+
+st.cache_data hands each caller a pickled copy of what it caches, so memory
+grows with the number of viewers. Instead, a dataset is published once as an
+uncompressed Arrow IPC file under data/shared/, and readers memory-map it:
+the pages of the file live in the OS page cache, shared by every process
+that maps it, and each process keeps one open Table for all its sessions.
+
+A dataset is one table or several published together (eBird's normalized
+checklists, taxonomy and observations). Publishing writes a new version file
+per table and then swaps a small pointer file (<name>.json), so readers move
+to the new version of every table at once on their next lookup and never see
+a partial file. The previous version is kept, so a reader that read the old
+pointer can still open it; older ones are removed.
+"""
+import json
+import threading
+import time
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import data_index
+import ebird_model
+import ebird_store
+import weather
+
+# === Constants ===
+SHARED_DIR = ebird_store.DATA_DIR / "shared"
+# Table name of a dataset published from a single frame
+TABLE = "data"
+
+_lock = threading.Lock()
+_open = {}
+# Sessions and the warm-up thread check for changes concurrently; one of them imports and publishes
+_publish_lock = threading.RLock()
+
+def pointer_path(name, directory=SHARED_DIR):
+    return Path(directory) / f"{name}.json"
+
+def read_pointer(name, directory=SHARED_DIR):
+    """{"files", "version", "rows", "source"} of the current version, or None if never published."""
+    try:
+        with open(pointer_path(name, directory)) as f:
+            pointer = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A pointer from before datasets held several tables counts as never published
+    return pointer if "files" in pointer else None
+
+def version(name, directory=SHARED_DIR):
+    """Current version id of a dataset (a cheap cache key for the pages), or None."""
+    pointer = read_pointer(name, directory)
+    return pointer["version"] if pointer else None
+
+def publish(name, df, source=None, directory=SHARED_DIR):
+    """
+    Write df, or {table: df} for several tables published together, as the
+    next version of a dataset and make it current. Returns the new version id.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    new_version = time.time_ns()
+    files, rows = {}, {}
+    for table_name, table_df in (df if isinstance(df, dict) else {TABLE: df}).items():
+        file_name = f"{name}-{new_version}.{table_name}.arrow"
+        table = pa.Table.from_pandas(table_df, preserve_index=False)
+        tmp_file = directory / f"{file_name}.tmp"
+        # Uncompressed, so mapped buffers can be used in place
+        with ipc.new_file(str(tmp_file), table.schema) as writer:
+            writer.write_table(table)
+        tmp_file.replace(directory / file_name)
+        files[table_name], rows[table_name] = file_name, table.num_rows
+
+    previous = read_pointer(name, directory)
+    pointer = {"files": files, "version": new_version, "rows": rows, "source": source}
+    tmp_pointer = pointer_path(name, directory).with_suffix(".json.tmp")
+    with open(tmp_pointer, "w") as f:
+        json.dump(pointer, f, indent=2)
+    tmp_pointer.replace(pointer_path(name, directory))
+
+    keep = set(files.values()) | set(previous["files"].values() if previous else [])
+    for path in directory.glob(f"{name}-*.arrow"):
+        if path.name not in keep:
+            # Processes still mapping it keep their view; the space is freed when they let go
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    return new_version
+
+def ensure(name, source, build, directory=SHARED_DIR):
+    """Publish build() as `name` unless the current version was built from `source`. Returns the current version id."""
+    with _publish_lock:
+        pointer = read_pointer(name, directory)
+        if pointer is not None and pointer.get("source") == source:
+            return pointer["version"]
+        return publish(name, build(), source, directory)
+
+def open_tables(name, directory=SHARED_DIR):
+    """
+    {table: memory-mapped Arrow Table} of the current version, all from the
+    same pointer, opened once per process and version; the buffers point into
+    the mapping, nothing is read up front. Raises FileNotFoundError if the
+    dataset was never published.
+    """
+    pointer = read_pointer(name, directory)
+    if pointer is None:
+        raise FileNotFoundError(f"Shared dataset {name!r} has not been published")
+    tables = {}
+    with _lock:
+        for table_name, file_name in pointer["files"].items():
+            key = (str(directory), name, table_name)
+            cached = _open.get(key)
+            if cached is None or cached[0] != file_name:
+                table = ipc.open_file(pa.memory_map(str(Path(directory) / file_name), "r")).read_all()
+                # Swapped in one step; sessions holding the old Table keep a valid view of the old file
+                cached = _open[key] = (file_name, table)
+            tables[table_name] = cached[1]
+    return tables
+
+def open_table(name, directory=SHARED_DIR, table=TABLE):
+    """One table of the current version, as open_tables() maps it."""
+    return open_tables(name, directory)[table]
+
+def to_frame(table, arrow_backed=False):
+    """
+    A mapped Table as a DataFrame. Fixed-width columns without nulls (dates,
+    numbers) are views on the mapping; other columns are converted, unless
+    arrow_backed, where every column stays an Arrow-backed view (ArrowDtype).
+    """
+    return table.to_pandas(split_blocks=True, types_mapper=pd.ArrowDtype if arrow_backed else None)
+
+def frame(name, columns=None, directory=SHARED_DIR, table=TABLE, arrow_backed=False):
+    """
+    One table of the current version as a DataFrame (see to_frame()). The
+    converted columns are converted per call, so callers cache the result per
+    process.
+    """
+    mapped = open_table(name, directory, table)
+    if columns is not None:
+        mapped = mapped.select(columns)
+    return to_frame(mapped, arrow_backed)
+
+def frames(name, directory=SHARED_DIR, arrow_backed=()):
+    """Every table of the current version as {table: DataFrame}; tables named in arrow_backed stay Arrow-backed views."""
+    return {table_name: to_frame(table, table_name in arrow_backed) for table_name, table in open_tables(name, directory).items()}
+
+# === Publishers ===
+# Tables of the "ebird" dataset that read_ebird() leaves as Arrow-backed views: the bulk of
+# the data, all integers and flags, so nothing of it is copied per process
+EBIRD_ARROW_BACKED = ["observations"]
+
+def publish_ebird(csv_path=None, directory=SHARED_DIR):
+    """
+    Publish the ebird_model tables of the store, with weather.attach()'s
+    columns on the checklists, as "ebird" unless the current version already
+    holds them, first importing csv_path if given and changed.
+    Returns the version id.
+    """
+    with _publish_lock:
+        if csv_path is not None:
+            ebird_store.refresh_store(csv_path)
+        # Each checklist carries its day's weather; a backfilled climate table republishes too
+        build = lambda: ebird_model.EbirdTables(
+            weather.attach(ebird_store.read_store(ebird_model.COLUMNS), weather.read_climate())
+        ).tables()
+        return ensure("ebird", [ebird_store.store_signature(), weather.climate_signature()], build, directory)
+
+def read_ebird(directory=SHARED_DIR):
+    """EbirdTables over the current "ebird" version; the observations are views on the mapping."""
+    return ebird_model.EbirdTables.from_tables(**frames("ebird", directory, EBIRD_ARROW_BACKED))
+
+# Phenology CSV headers (build_csv.py output) -> the dashboard's names
+PHENO_COLUMNS = {
+    "OBSERVATIONDATETIME": "Date",
+    "LOCATION": "Location",
+    "WEDGE": "Wedge",
+    "CATEGORY": "Category",
+    "COMMONNAME": "Common Name",
+    "SCIENTIFICNAME": "Scientific Name",
+    "STATUS": "Status",
+    "NOTES": "Notes"
+}
+
+def pheno_frame(df):
+    """Phenology rows (CSV headers) in the dashboard's layout, sorted by date. Raises ValueError if required columns are missing."""
+    # Normalize column names, dropping the BOM and junk Excel columns like "Unnamed: 8"
+    df = df.copy()
+    df.columns = df.columns.str.strip().str.upper().str.replace("\ufeff", "", regex=False)
+    df = df.loc[:, ~df.columns.str.contains("^UNNAMED", case=False)]
+    missing = [c for c in PHENO_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing} (columns found: {df.columns.tolist()})")
+    df["OBSERVATIONDATETIME"] = pd.to_datetime(df["OBSERVATIONDATETIME"], errors="coerce")
+    df = df.dropna(subset=["OBSERVATIONDATETIME"]).rename(columns=PHENO_COLUMNS)
+    # Location/category/name filters work on integer codes
+    for col in ["Location", "Category", "Common Name", "Scientific Name"]:
+        df[col] = df[col].astype("category")
+    return data_index.sort_by_date(df)
+
+def read_pheno(csv_path, sep="\t"):
+    """A phenology CSV (the dashboard's is tab-separated) through pheno_frame()."""
+    return pheno_frame(pd.read_csv(csv_path, encoding="utf-8", sep=sep, on_bad_lines="skip"))
+
+def publish_pheno(csv_path, sep="\t", directory=SHARED_DIR, climate_file=weather.CLIMATE_FILE):
+    """
+    Publish a phenology CSV, with weather.attach()'s columns, as "pheno"
+    unless the current version was read from it as it is now. Returns the
+    version id.
+    """
+    build = lambda: weather.attach(read_pheno(csv_path, sep), weather.read_climate(climate_file))
+    return ensure("pheno", [ebird_store.source_fingerprint(csv_path), weather.climate_signature(climate_file)], build, directory)
@@ -0,0 +1,175 @@
+"""
+Local stub of the two HTTP APIs the ingest and the dashboards call.
+
+    /v2/data/obs/{locId}/historic/{y}/{m}/{d}   eBird historic observations
+    /v1/archive                                 Open-Meteo daily archive
+
+Responses are deterministic for a given hotspot, day or date range. Each
+request waits `latency` seconds first, and a share `error_rate` of them fail
+with a 429 (Retry-After: 0) or a 5xx, so the fetchers' retry paths run too.
+`species_per_day` sets the eBird payload size (records per hotspot-day).
+
+    python stub_server.py --port 8765 --latency 0.05 --error-rate 0.05
+
+prints the EBIRD_API_URL / OPEN_METEO_ARCHIVE_URL values that point
+update_data.py, weather.py and the dashboards at it.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# === Constants ===
+FAULT_STATUSES = [429, 500, 502, 503, 504]
+STUB_SPECIES = [
+    ("norcar", "Northern Cardinal", "Cardinalis cardinalis"),
+    ("blujay", "Blue Jay", "Cyanocitta cristata"),
+    ("carwre", "Carolina Wren", "Thryothorus ludovicianus"),
+    ("moudov", "Mourning Dove", "Zenaida macroura"),
+    ("grekis", "Great Kiskadee", "Pitangus sulphuratus"),
+    ("blkvul", "Black Vulture", "Coragyps atratus"),
+    ("houspa", "House Sparrow", "Passer domesticus"),
+    ("gretgr", "Great-tailed Grackle", "Quiscalus mexicanus")
+]
+
+# === Payloads ===
+def stub_species(i):
+    """(code, common name, scientific name) of a checklist's i-th record; past STUB_SPECIES they are numbered, so each is distinct."""
+    code, name, sci = STUB_SPECIES[i % len(STUB_SPECIES)]
+    cycle = i // len(STUB_SPECIES)
+    if cycle == 0:
+        return code, name, sci
+    return f"{code}{cycle}", f"{name} {cycle + 1}", f"{sci} {cycle + 1}"
+
+def stub_observations(loc_id, day, species_per_day):
+    """One checklist per hotspot-day of species_per_day records, each of a different species (as eBird reports them)."""
+    rng = random.Random(f"{loc_id}:{day}")
+    sub_id = f"S{rng.randrange(10**9)}"
+    obs_time = f"{rng.randint(6, 10):02d}:{rng.randint(0, 59):02d}"
+    return [
+        {
+            "speciesCode": code,
+            "comName": name,
+            "sciName": sci,
+            "locId": loc_id,
+            "obsDt": f"{day.isoformat()} {obs_time}",
+            "howMany": rng.randint(1, 12),
+            "subId": sub_id,
+            "obsId": f"OBS{rng.randrange(10**9)}"
+        }
+        for code, name, sci in map(stub_species, range(species_per_day))
+    ]
+
+def stub_archive(start, end):
+    """Open-Meteo-shaped daily block for start..end: a seasonal temperature cycle and occasional rain, in °F and inches."""
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    temp_max, temp_min, rain = [], [], []
+    for day in days:
+        rng = random.Random(day.toordinal())
+        season = math.sin(2 * math.pi * (day.timetuple().tm_yday - 110) / 365.25)
+        high = 80 + 16 * season + rng.gauss(0, 4)
+        temp_max.append(round(high, 1))
+        temp_min.append(round(high - 18 - rng.random() * 6, 1))
+        rain.append(round(rng.expovariate(3), 2) if rng.random() < 0.25 else 0.0)
+    return {
+        "daily_units": {"time": "iso8601", "temperature_2m_max": "°F", "temperature_2m_min": "°F", "precipitation_sum": "inch"},
+        "daily": {
+            "time": [day.isoformat() for day in days],
+            "temperature_2m_max": temp_max,
+            "temperature_2m_min": temp_min,
+            "precipitation_sum": rain
+        }
+    }
+
+# === Server ===
+def make_handler(latency=0.05, error_rate=0.0, species_per_day=40, seed=None):
+    faults = random.Random(seed)
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_body(self, status, body=b"", headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(latency)
+            with lock:
+                fault = faults.choice(FAULT_STATUSES) if faults.random() < error_rate else None
+            if fault is not None:
+                self.send_body(fault, headers=[("Retry-After", "0")] if fault == 429 else [])
+                return
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            try:
+                if parts[-1] == "archive":
+                    query = parse_qs(url.query)
+                    payload = stub_archive(date.fromisoformat(query["start_date"][0]), date.fromisoformat(query["end_date"][0]))
+                elif "obs" in parts:
+                    # .../data/obs/{locId}/historic/{y}/{m}/{d}
+                    payload = stub_observations(parts[-5], date(int(parts[-3]), int(parts[-2]), int(parts[-1])), species_per_day)
+                else:
+                    raise KeyError(url.path)
+            except (IndexError, KeyError, ValueError):
+                self.send_body(404)
+                return
+            self.send_body(200, json.dumps(payload).encode(), [("Content-Type", "application/json")])
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+def serve(port=0, **handler_options):
+    """Start the stub on a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(**handler_options))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def api_urls(base_url):
+    """Environment that points the fetchers at a stub running at base_url."""
+    return {"EBIRD_API_URL": f"{base_url}/v2", "OPEN_METEO_ARCHIVE_URL": f"{base_url}/v1/archive"}
+
+@contextmanager
+def pointed_at(base_url):
+    """Point the fetchers at the stub for the duration of the block."""
+    saved = {name: os.environ.get(name) for name in api_urls(base_url)}
+    os.environ.update(api_urls(base_url))
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the eBird and Open-Meteo APIs")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of requests answered with 429/5xx")
+    parser.add_argument("--species-per-day", type=int, default=40, help="eBird records per hotspot-day")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the fault sequence")
+    args = parser.parse_args()
+    server, base_url = serve(args.port, latency=args.latency, error_rate=args.error_rate,
+                             species_per_day=args.species_per_day, seed=args.seed)
+    print(f"Stub APIs at {base_url}. Point the fetchers at them with:")
+    for name, value in api_urls(base_url).items():
+        print(f"  export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,36 @@
+import pandas as pd
+import ebird_store
+
+HEADER = ["GLOBAL UNIQUE IDENTIFIER", "COMMON NAME", "SCIENTIFIC NAME", "OBSERVATION COUNT", "LOCALITY ID",
+          "OBSERVATION DATE", "TIME OBSERVATIONS STARTED", "OBSERVER ID"]
+ROWS = [
+    ["URN:CornellLabOfOrnithology:EBIRD:OBS1", "Fox Sparrow", "Passerella iliaca", "X", "L1210588", "1/16/1985", "", "obsr1"],
+    # The same sighting again
+    ["URN:CornellLabOfOrnithology:EBIRD:OBS1", "Fox Sparrow", "Passerella iliaca", "X", "L1210588", "1/16/1985", "", "obsr1"],
+    # No GUID: one shared checklist as each observer exported it, and a second species
+    ["", "American Robin", "Turdus migratorius", "2", "L1210588", "7/17/2025", "8:59:00 AM", "obsr2"],
+    ["", "American Robin", "Turdus migratorius", "2", "L1210588", "7/17/2025", "8:59:00 AM", "obsr3"],
+    ["", "Barn Swallow", "Hirundo rustica", "5", "L1210588", "7/17/2025", "8:59:00 AM", "obsr2"],
+    # And the first of those again
+    ["", "American Robin", "Turdus migratorius", "2", "L1210588", "7/17/2025", "8:59:00 AM", "obsr2"],
+]
+
+def write_export(path):
+    pd.DataFrame(ROWS, columns=HEADER).to_csv(path, index=False)
+    return path
+
+def test_import_keeps_rows_without_guid(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = write_export(tmp_path / "export.csv")
+    report = ebird_store.import_csv(path)
+    assert (report["added"], report["duplicates"]) == (4, 2)
+    store = ebird_store.read_store(ebird_store.STORE_COLUMNS)
+    assert store["Global ID"].isna().sum() == 3
+    assert store["Observation ID"].notna().all()
+
+def test_reimport_adds_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = write_export(tmp_path / "export.csv")
+    ebird_store.import_csv(path)
+    report = ebird_store.append_csv(path)
+    assert (report["added"], report["duplicates"]) == (0, 6)
@@ -0,0 +1,144 @@
+"""
+Lightweight per-stage timing for the dashboards and the data scripts.
+
+Wrap a stage in `with timing.stage("phenology.filter", rows_in=len(df)) as t:`
+and set t["rows_out"] inside it, or decorate a function with @timed(name).
+Each finished stage records its wall time, rows in/out, cache hit/miss (for
+stages around st.cache_data loaders; the loader body calls cache_miss()) and
+the change in resident memory.
+
+Records are kept in memory per script run so app.py can show the current run
+in its sidebar panel. Set TIMING_LOG to a path (e.g. data/timing.jsonl) to
+also append them to a JSONL log; once it passes TIMING_LOG_MAX_BYTES it is
+rotated to <path>.1, so at most two files of that size are kept.
+Nothing here depends on Streamlit, so update_data.py and build_csv.py use it too.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+
+# === Constants ===
+LOG_FILE = os.environ.get("TIMING_LOG", "")
+LOG_MAX_BYTES = int(os.environ.get("TIMING_LOG_MAX_BYTES", 10 * 2**20))
+RECENT_LIMIT = 1000
+
+_local = threading.local()
+_write_lock = threading.Lock()
+RECENT = deque(maxlen=RECENT_LIMIT)
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+def rss_bytes():
+    """Current resident set size, or None where /proc is unavailable."""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def begin_run(source):
+    """Start a new run (one script run or one script invocation) on this thread. Returns its id."""
+    _local.run = uuid.uuid4().hex[:12]
+    _local.source = source
+    return _local.run
+
+def current_run():
+    return getattr(_local, "run", None)
+
+def run_records(run=None):
+    """Records of one run (default: this thread's current run), oldest first."""
+    run = run or current_run()
+    return [record for record in list(RECENT) if record["run"] == run]
+
+def cache_miss():
+    """Called at the top of a cached loader's body: the enclosing stage was a cache miss."""
+    stack = _stack()
+    if stack and stack[-1]["cache"] is not None:
+        stack[-1]["cache"] = "miss"
+
+def write_log(record):
+    if not LOG_FILE:
+        return
+    try:
+        path = Path(LOG_FILE)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with _write_lock:
+            if path.exists() and path.stat().st_size >= LOG_MAX_BYTES:
+                path.replace(path.with_name(path.name + ".1"))
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+    except OSError:
+        # Read-only deploys still get the in-memory panel
+        pass
+
+@contextmanager
+def stage(name, rows_in=None, cached=False):
+    """
+    Time one stage. Yields the record; set record["rows_out"] (or any other
+    field) inside the block. cached=True marks a call to an st.cache_data
+    loader: it counts as a hit unless the loader body calls cache_miss().
+    """
+    record = {
+        "run": current_run(),
+        "source": getattr(_local, "source", None),
+        "stage": name,
+        "started": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "seconds": None,
+        "rows_in": rows_in,
+        "rows_out": None,
+        "cache": "hit" if cached else None,
+        "rss_delta_mb": None,
+        "error": None
+    }
+    stack = _stack()
+    stack.append(record)
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["seconds"] = round(time.perf_counter() - started, 6)
+        rss_after = rss_bytes()
+        if rss_before is not None and rss_after is not None:
+            record["rss_delta_mb"] = round((rss_after - rss_before) / 2**20, 2)
+        stack.pop()
+        RECENT.append(record)
+        write_log(record)
+
+def timed(name):
+    """Decorator form of stage(); rows_out is len() of the result when it has one."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name) as record:
+                result = fn(*args, **kwargs)
+                record["rows_out"] = _length(result)
+                return result
+        return wrapper
+    return decorator
+
+def _length(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
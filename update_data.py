@@ -3,67 +3,99 @@ import pandas as pd
 import requests
 from pathlib import Path
 from datetime import datetime, timedelta
+import ebird_fetch
+import ebird_store
+import http_transport
+import rollups
+import shared_data
+import timing
 
 # === Constants ===
-HEADWATERS_LOCATIONS = ["L1210588"]
-# The file is in the main branch
-DATA_FILE = Path("historical_checklists.csv") 
+HEADWATERS_LOCATIONS = ebird_store.HEADWATERS_LOCATIONS
+# The CSV export in the main branch; imported into ebird_store.STORE_DIR
+DATA_FILE = ebird_store.CSV_FILE
 
-def fetch_new_data(loc_id, start_date, end_date):
+def fetch_new_data(loc_ids, start_date, end_date, on_chunk):
     """
-    Fetches new eBird data for a location.
-    NOTE: This function requires an eBird API key.
+    Fetches new eBird data for the given locations, one chunk per hotspot per day,
+    and streams each chunk to on_chunk as it arrives.
+    NOTE: This function requires an eBird API key (unless EBIRD_API_URL points at a local stub,
+    or NATURENOTES_HTTP=replay serves recorded responses).
     If an API key is not provided, this function will not run.
     """
     ebird_api_key = os.environ.get("EBIRD_API_KEY")
+    if not ebird_api_key and (ebird_fetch.api_url() != ebird_fetch.DEFAULT_API_URL or http_transport.mode() == "replay"):
+        ebird_api_key = "stub"
     if not ebird_api_key:
         print("Warning: EBIRD_API_KEY is not set. Skipping API data fetch.")
-        return []
+        return 0, []
     
-    url = f"https://api.ebird.org/v2/data/obs/loc/{loc_id}/historic"
-    headers = {"X-eBirdApiToken": ebird_api_key}
-    params = {
-        "startDate": start_date.strftime("%Y-%m-%d"),
-        "endDate": end_date.strftime("%Y-%m-%d"),
-    }
-    
-    print(f"Fetching new data for location {loc_id} from {start_date} to {end_date}...")
-    
-    response = requests.get(url, headers=headers, params=params)
-    
-    if response.status_code == 403:
-        raise requests.exceptions.HTTPError("403 Forbidden: Invalid or expired API key. Please check your EBIRD_API_KEY secret.")
-    
-    response.raise_for_status()
-    return response.json()
+    print(f"Fetching new data for locations {', '.join(loc_ids)} from {start_date} to {end_date}...")
+    return ebird_fetch.fetch_observations(loc_ids, start_date, end_date, ebird_api_key, on_chunk)
+
+def update_rollups():
+    with timing.stage("update.rollups") as t:
+        t["rows_out"] = rollups.update_ebird()
+    if t["rows_out"]:
+        print(f"Updated the rollups for {t['rows_out']} day(s).")
+
+def publish_shared():
+    # Running dashboards map the new version on their next rerun
+    with timing.stage("update.publish_shared"):
+        version = shared_data.publish_ebird()
+    print(f"Shared eBird dataset at version {version}.")
+
+def ingest(start_date, end_date):
+    """
+    Fetch start..end for the Headwaters hotspots into the store, then update
+    the rollups and the shared dataset. Returns (writer, failed chunks); the
+    writer has the received / added counts. Raises requests' HTTPError when
+    the fetch is aborted.
+    """
+    try:
+        with timing.stage("update.fetch_and_append") as t:
+            with ebird_store.ObservationWriter() as writer:
+                fetched, failed = fetch_new_data(HEADWATERS_LOCATIONS, start_date, end_date, writer.write)
+            t["rows_in"], t["rows_out"] = fetched, writer.added
+    finally:
+        # Whatever reached the store, including a fresh import, is folded into the rollups and the shared dataset
+        update_rollups()
+        publish_shared()
+    return writer, failed
 
 def main():
-    if not DATA_FILE.exists():
-        print("Historical data file not found. Please ensure historical_checklists.csv is in the main branch.")
-        return 
+    timing.begin_run("update_data")
+    if not ebird_store.store_is_current(DATA_FILE):
+        if DATA_FILE.exists():
+            print(f"Importing {DATA_FILE} into {ebird_store.STORE_DIR}...")
+            with timing.stage("update.import_csv") as t:
+                report = ebird_store.import_csv(DATA_FILE)
+                t["rows_in"], t["rows_out"] = report["rows_read"], report["added"]
+            print(ebird_store.format_import_report(report))
+        elif not ebird_store.store_exists():
+            print("Historical data file not found. Please ensure historical_checklists.csv is in the main branch.")
+            return
         
-    existing_df = pd.read_csv(DATA_FILE, encoding='cp1252', on_bad_lines='skip')
-    print("Columns in your file:", existing_df.columns.tolist())
-    
-    last_obs_date = pd.to_datetime(existing_df['OBSERVATION DATE']).max().date()
-    start_date = last_obs_date + timedelta(days=1)
+    # Only the sidecar is read here; the history itself is never loaded
+    last_obs_date = ebird_store.high_water_mark()
+    if last_obs_date is None:
+        print("The eBird store is empty. Nothing to update from.")
+        return
+    # Re-fetch the last day too: checklists submitted late are caught and the key index drops repeats
+    start_date = last_obs_date
     end_date = datetime.now().date()
     print(f"Existing data found. Updating from last observation date: {start_date}")
         
-    all_new_obs = []
+    try:
+        writer, failed = ingest(start_date, end_date)
+    except requests.exceptions.HTTPError as e:
+        print(f"Error fetching new data: {e}")
+        return
     
-    for loc_id in HEADWATERS_LOCATIONS:
-        try:
-            new_data = fetch_new_data(loc_id, start_date, end_date)
-            all_new_obs.extend(new_data)
-        except requests.exceptions.HTTPError as e:
-            print(f"Error fetching new data for location {loc_id}: {e}")
-            
-    if all_new_obs:
-        new_df = pd.DataFrame(all_new_obs)
-        combined_df = pd.concat([existing_df, new_df], ignore_index=True).drop_duplicates(subset=['subId']).reset_index(drop=True)
-        combined_df.to_csv(DATA_FILE, index=False)
-        print(f"Successfully updated data with {len(new_df)} new observations.")
+    if failed:
+        print(f"Warning: {len(failed)} hotspot-day(s) failed after retries: " + ", ".join(f"{loc} {day}" for loc, day in sorted(failed)))
+    if writer.received:
+        print(f"Successfully appended {writer.added} new observations ({writer.received - writer.added} already stored).")
     else:
         print("No new data to add.")
 
@@ -0,0 +1,116 @@
+"""
+Background warm-up of the dashboard data.
+
+app.py imports a page only when it is selected, so without this the first
+visitor to each dashboard pays for the import, parsing and cleaning, and the
+first weather lookups. start() runs the pages' own cached loaders on a daemon
+thread once per server process, filling the same shared caches (and the
+weather store) a page run would. status() reports how far it has got, so
+pages can render what is ready instead of blocking on the rest.
+"""
+import threading
+import time
+from datetime import timedelta
+
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+_lock = threading.Lock()
+_thread = None
+_state = {}
+
+# === Tasks ===
+def warm_ebird():
+    from pages import _1_eBird_Dashboard as page
+    version = page.current_ebird_version()
+    page.load_ebird_tables(version)
+    page.load_presence_matrix(version)
+    page.load_activity_rollups(version)
+
+def warm_butterfly():
+    import butterfly_store
+    from pages import _2_Butterfly_Dashboard as page
+    import weather
+    page.load_survey_matrix(butterfly_store.source_signature())
+    page.load_survey_totals(butterfly_store.source_signature(), weather.climate_signature())
+
+def warm_phenology():
+    from pages import _3_Phenology_Dashboard as page
+    version = page.current_pheno_version()
+    page.load_pheno_data(version)
+    page.load_count_cube(version).cumulative
+    page.load_pheno_rollups(version)
+
+def warm_weather():
+    """The weather each page asks for on its first render."""
+    import butterfly_store
+    import weather
+    from pages import _1_eBird_Dashboard as ebird
+    from pages import _2_Butterfly_Dashboard as butterfly
+    from pages import _3_Phenology_Dashboard as phenology
+
+    tables = ebird.load_ebird_tables(ebird.current_ebird_version())
+    if tables is not None and len(tables):
+        latest = tables.latest_date()
+        weather.get_daily(ebird.LATITUDE, ebird.LONGITUDE, latest - timedelta(days=30), latest)
+
+    surveys = butterfly.load_survey_matrix(butterfly_store.source_signature()).survey_dates()
+    if surveys:
+        weather.get_daily(butterfly.LATITUDE, butterfly.LONGITUDE, surveys[0], surveys[-1])
+
+    pheno_df, _, _ = phenology.load_pheno_data(phenology.current_pheno_version())
+    if not pheno_df.empty:
+        # The range filter defaults to the whole record
+        weather.get_daily(phenology.LATITUDE, phenology.LONGITUDE, pheno_df["Date"].iloc[0], pheno_df["Date"].iloc[-1])
+
+# Run in order; weather goes last since it reuses the loaded data and needs the network
+TASKS = [
+    ("ebird", "eBird", warm_ebird),
+    ("butterfly", "Butterflies", warm_butterfly),
+    ("phenology", "Phenology", warm_phenology),
+    ("weather", "Weather", warm_weather)
+]
+
+def _set(name, **fields):
+    with _lock:
+        _state[name].update(fields)
+
+def _run():
+    for name, _, task in TASKS:
+        _set(name, status=RUNNING)
+        started = time.perf_counter()
+        try:
+            task()
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}")
+            _set(name, status=FAILED, error=str(e), seconds=time.perf_counter() - started)
+        else:
+            _set(name, status=READY, seconds=time.perf_counter() - started)
+
+# === Public API ===
+def start():
+    """Start the warm-up thread, once per process. Later calls do nothing."""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        for name, label, _ in TASKS:
+            _state[name] = {"label": label, "status": PENDING, "seconds": None, "error": None}
+        _thread = threading.Thread(target=_run, name="naturenotes-warmup", daemon=True)
+        _thread.start()
+
+def status():
+    """{name: {"label", "status", "seconds", "error"}} for every task; empty if never started."""
+    with _lock:
+        return {name: dict(fields) for name, fields in _state.items()}
+
+def in_progress(name):
+    """True while a task is still queued or running. False once it has finished, or if warm-up never started."""
+    with _lock:
+        return name in _state and _state[name]["status"] in (PENDING, RUNNING)
+
+def done():
+    with _lock:
+        return all(fields["status"] in (READY, FAILED) for fields in _state.values())
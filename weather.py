@@ -0,0 +1,364 @@
+"""
+Shared daily weather store for all three dashboards.
+
+Daily values from the Open-Meteo archive are kept in a local SQLite table
+keyed by (lat, lon, date), so they survive restarts and are shared by every
+session. A lookup only goes to the network for the dates the table does not
+have yet, and fetches those gaps as a few coalesced date ranges. Recent days
+the archive has not filled in yet are stored too, with the time they were
+fetched, and only fetched again once that is PROVISIONAL_TTL old.
+
+Values are stored in the units the dashboards display: °F and inches.
+
+backfill() also fills the store for every day since 1985 and writes the
+climate table (data/climate.parquet) that ingest joins onto checklists,
+surveys and observations with attach(). That table is read locally, so
+the weather-vs-abundance views never go to the network.
+"""
+import argparse
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+import http_transport
+import timing
+
+# === Constants ===
+DEFAULT_ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+DB_FILE = Path(os.environ.get("WEATHER_DB", "data/weather.sqlite"))
+TIMEZONE = "America/Chicago"
+COLUMNS = ["Date", "temp_max", "temp_min", "precipitation"]
+# The archive lags real time by a few days; missing values that recent are not final
+ARCHIVE_LAG_DAYS = 7
+# Such incomplete recent days are served from the store for this long before they are fetched again
+PROVISIONAL_TTL = timedelta(hours=1)
+# Gaps separated by at most this many already-stored days are fetched as one range
+COALESCE_DAYS = 14
+# Concurrent archive requests when a lookup needs several ranges
+MAX_FETCH_WORKERS = 4
+# Retries of a 429/5xx archive response before the lookup fails
+FETCH_RETRIES = 3
+
+# === Climate table ===
+# One grid cell covers the whole preserve
+CLIMATE_LOCATION = (29.4689, -98.4798)
+CLIMATE_START = date(1985, 1, 1)
+CLIMATE_FILE = Path("data/climate.parquet")
+# Backfill requests are split into ranges of at most this many days
+BACKFILL_CHUNK_DAYS = 366
+# Columns attach() adds; precipitation_7d is the rain of that day and the six before it
+ATTACHED_COLUMNS = ["temp_max", "temp_min", "precipitation", "precipitation_7d"]
+# A row dated on a day the table lacks takes the latest earlier day at most this far back
+ASOF_TOLERANCE_DAYS = 3
+# Local stand-in for the archive (weather_data.csv layout) -> store columns
+FILE_COLUMNS = {
+    "Date": "Date",
+    "Max Temp (F)": "temp_max",
+    "Min Temp (F)": "temp_min",
+    "Precipitation (in)": "precipitation"
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_weather (
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    date TEXT NOT NULL,
+    temp_max REAL,
+    temp_min REAL,
+    precipitation REAL,
+    fetched_at TEXT,
+    PRIMARY KEY (lat, lon, date)
+) WITHOUT ROWID
+"""
+
+def to_date(x):
+    """Safely convert various date-like objects to a Python date."""
+    if isinstance(x, pd.Timestamp):
+        return x.date()
+    if isinstance(x, date):
+        return x if type(x) is date else date(x.year, x.month, x.day)
+    return pd.to_datetime(x).date()
+
+def location_key(lat, lon):
+    return round(float(lat), 4), round(float(lon), 4)
+
+def connect():
+    DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    conn.execute(SCHEMA)
+    # Stores created before fetched_at was recorded; their rows are all final
+    if "fetched_at" not in [row[1] for row in conn.execute("PRAGMA table_info(daily_weather)")]:
+        with conn:
+            conn.execute("ALTER TABLE daily_weather ADD COLUMN fetched_at TEXT")
+    return conn
+
+# === Local store ===
+def read_range(conn, lat, lon, start, end):
+    lat, lon = location_key(lat, lon)
+    df = pd.read_sql_query(
+        "SELECT date AS Date, temp_max, temp_min, precipitation FROM daily_weather "
+        "WHERE lat = ? AND lon = ? AND date BETWEEN ? AND ? ORDER BY date",
+        conn, params=(lat, lon, start.isoformat(), end.isoformat())
+    )
+    df["Date"] = pd.to_datetime(df["Date"])
+    return df
+
+def stored_dates(conn, lat, lon, stored):
+    """
+    Dates of read_range() rows that count as stored: all of them except
+    recent days with missing values fetched PROVISIONAL_TTL ago or more,
+    which the archive may have filled in since.
+    """
+    lat, lon = location_key(lat, lon)
+    stale = conn.execute(
+        "SELECT date FROM daily_weather WHERE lat = ? AND lon = ? AND date >= ? "
+        "AND (temp_max IS NULL OR temp_min IS NULL OR precipitation IS NULL) AND fetched_at < ?",
+        (lat, lon, (date.today() - timedelta(days=ARCHIVE_LAG_DAYS)).isoformat(),
+         (datetime.now(timezone.utc) - PROVISIONAL_TTL).isoformat(timespec="seconds"))
+    ).fetchall()
+    return set(stored["Date"].dt.date) - {date.fromisoformat(row[0]) for row in stale}
+
+def store_rows(conn, lat, lon, df):
+    lat, lon = location_key(lat, lon)
+    fetched_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    rows = [
+        (lat, lon, d.strftime("%Y-%m-%d"), *(None if pd.isna(v) else float(v) for v in values), fetched_at)
+        for d, *values in df[COLUMNS].itertuples(index=False)
+    ]
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO daily_weather VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+def missing_ranges(stored_dates, start, end, coalesce_days=COALESCE_DAYS):
+    """Contiguous [start, end] ranges of dates in the window that are not stored, merged across short stored runs."""
+    stored = set(stored_dates)
+    ranges = []
+    day = start
+    while day <= end:
+        if day in stored:
+            day += timedelta(days=1)
+            continue
+        run_start = day
+        while day <= end and day not in stored:
+            day += timedelta(days=1)
+        run_end = day - timedelta(days=1)
+        if ranges and (run_start - ranges[-1][1]).days - 1 <= coalesce_days:
+            ranges[-1] = (ranges[-1][0], run_end)
+        else:
+            ranges.append((run_start, run_end))
+    return ranges
+
+def date_runs(dates, coalesce_days=COALESCE_DAYS):
+    """Group dates into the fewest [start, end] ranges, merging runs separated by at most coalesce_days."""
+    ranges = []
+    for day in sorted(set(dates)):
+        if ranges and (day - ranges[-1][1]).days - 1 <= coalesce_days:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+# === Open-Meteo archive ===
+def archive_url():
+    # OPEN_METEO_ARCHIVE_URL points the fetches at stub_server.py
+    return os.environ.get("OPEN_METEO_ARCHIVE_URL", DEFAULT_ARCHIVE_URL)
+
+def fetch_archive(lat, lon, start, end, session):
+    """One archive request for an inclusive date range, in °F and inches."""
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "daily": ["temperature_2m_max", "temperature_2m_min", "precipitation_sum"],
+        "temperature_unit": "fahrenheit",
+        "precipitation_unit": "inch",
+        "timezone": TIMEZONE
+    }
+    response = session.get(archive_url(), params=params, timeout=30)
+    response.raise_for_status()
+    daily = response.json().get("daily", {})
+    return pd.DataFrame({
+        "Date": pd.to_datetime(daily.get("time", [])),
+        "temp_max": pd.to_numeric(pd.Series(daily.get("temperature_2m_max", []), dtype=object), errors="coerce"),
+        "temp_min": pd.to_numeric(pd.Series(daily.get("temperature_2m_min", []), dtype=object), errors="coerce"),
+        "precipitation": pd.to_numeric(pd.Series(daily.get("precipitation_sum", []), dtype=object), errors="coerce")
+    })
+
+def fetch_ranges(lat, lon, ranges):
+    """
+    Fetch several date ranges, concurrently when there is more than one, as
+    one frame. One keep-alive session (on the http_transport in use) serves
+    them all; 429/5xx responses are retried with backoff.
+    """
+    with timing.stage("weather.fetch", rows_in=len(ranges)) as t, \
+            http_transport.make_session(MAX_FETCH_WORKERS, FETCH_RETRIES) as session:
+        if len(ranges) == 1:
+            fetched = fetch_archive(lat, lon, *ranges[0], session)
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(ranges), MAX_FETCH_WORKERS)) as pool:
+                fetched = pd.concat(pool.map(lambda r: fetch_archive(lat, lon, *r, session), ranges), ignore_index=True)
+        t["rows_out"] = len(fetched)
+    return fetched
+
+# === Public API ===
+def get_daily(lat, lon, start, end):
+    """
+    Daily weather for an inclusive date range, served from the local store.
+    Only missing dates are fetched. Raises requests exceptions if a needed fetch fails.
+    """
+    start, end = to_date(start), to_date(end)
+    if start > end:
+        start, end = end, start
+    end = min(end, date.today())
+    if start > end:
+        return pd.DataFrame(columns=COLUMNS)
+    conn = connect()
+    try:
+        stored = read_range(conn, lat, lon, start, end)
+        gaps = missing_ranges(stored_dates(conn, lat, lon, stored), start, end)
+        if gaps:
+            store_rows(conn, lat, lon, fetch_ranges(lat, lon, gaps))
+            stored = read_range(conn, lat, lon, start, end)
+        return stored
+    finally:
+        conn.close()
+
+def get_dates(lat, lon, dates):
+    """
+    Daily weather for any set of dates, as a frame indexed by date (ascending).
+    Dates not stored yet are fetched as the fewest coalesced ranges, concurrently,
+    so k scattered dates cost about one round trip. Dates after today or missing
+    from the archive come back as NaN rows. Raises requests exceptions if a needed fetch fails.
+    """
+    wanted = sorted({to_date(d) for d in dates})
+    index = pd.DatetimeIndex(pd.to_datetime(wanted), name="Date")
+    fetchable = [d for d in wanted if d <= date.today()]
+    if not fetchable:
+        return pd.DataFrame(columns=COLUMNS[1:], index=index, dtype=float)
+    conn = connect()
+    try:
+        stored = read_range(conn, lat, lon, fetchable[0], fetchable[-1])
+        ranges = date_runs(set(fetchable) - stored_dates(conn, lat, lon, stored))
+        if ranges:
+            store_rows(conn, lat, lon, fetch_ranges(lat, lon, ranges))
+            stored = read_range(conn, lat, lon, fetchable[0], fetchable[-1])
+    finally:
+        conn.close()
+    return stored.set_index("Date").reindex(index)
+
+# === Climate table ===
+def split_range(start, end, days=BACKFILL_CHUNK_DAYS):
+    """[start, end] as consecutive ranges of at most `days` days."""
+    ranges = []
+    while start <= end:
+        stop = min(end, start + timedelta(days=days - 1))
+        ranges.append((start, stop))
+        start = stop + timedelta(days=1)
+    return ranges
+
+def read_file(path):
+    """Daily weather from a local CSV in the weather_data.csv layout, as store columns."""
+    df = pd.read_csv(path)
+    missing = [c for c in FILE_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"{Path(path).name} is missing columns: {missing}")
+    df = df[list(FILE_COLUMNS)].rename(columns=FILE_COLUMNS)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    for col in COLUMNS[1:]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df.dropna(subset=["Date"])
+
+def backfill(lat=CLIMATE_LOCATION[0], lon=CLIMATE_LOCATION[1], start=CLIMATE_START, end=None, source_file=None, climate_file=CLIMATE_FILE):
+    """
+    Fill the store for every day start..end that it lacks, from the archive
+    (in ranges of BACKFILL_CHUNK_DAYS) or from a local source_file, then
+    rewrite the climate table. Returns the number of days added to the store.
+    """
+    start, end = to_date(start), min(to_date(end or date.today()), date.today())
+    conn = connect()
+    try:
+        stored = read_range(conn, lat, lon, start, end)
+        gaps = missing_ranges(stored_dates(conn, lat, lon, stored), start, end)
+        if gaps and Path(climate_file).exists():
+            # A fresh checkout has an empty store; the committed table seeds it so only new days are fetched
+            store_rows(conn, lat, lon, read_climate(climate_file)[COLUMNS])
+            stored = read_range(conn, lat, lon, start, end)
+            gaps = missing_ranges(stored_dates(conn, lat, lon, stored), start, end)
+        if source_file is not None:
+            fetched = read_file(source_file)
+            wanted = np.zeros(len(fetched), dtype=bool)
+            for gap_start, gap_end in gaps:
+                wanted |= fetched["Date"].between(pd.Timestamp(gap_start), pd.Timestamp(gap_end)).to_numpy()
+            fetched = fetched[wanted]
+        elif gaps:
+            fetched = fetch_ranges(lat, lon, [r for gap in gaps for r in split_range(*gap)])
+        else:
+            fetched = pd.DataFrame(columns=COLUMNS)
+        if len(fetched):
+            store_rows(conn, lat, lon, fetched)
+        daily = read_range(conn, lat, lon, start, end)
+    finally:
+        conn.close()
+    write_climate(climate_frame(daily), climate_file)
+    return len(fetched)
+
+def climate_frame(daily):
+    """Store rows (one per day) with the trailing 7-day precipitation, over consecutive days."""
+    daily = daily.set_index("Date").sort_index()
+    if len(daily):
+        daily = daily.reindex(pd.date_range(daily.index[0], daily.index[-1], freq="D", name="Date"))
+    daily["precipitation_7d"] = daily["precipitation"].rolling(7, min_periods=1).sum()
+    # Days with nothing recorded are left out, so attach() falls back to the latest day that has values
+    return daily.dropna(subset=COLUMNS[1:], how="all").reset_index()
+
+def write_climate(df, path=CLIMATE_FILE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_suffix(".parquet.tmp")
+    df.astype({col: "float32" for col in ATTACHED_COLUMNS}).to_parquet(tmp_file, index=False)
+    tmp_file.replace(path)
+
+def read_climate(path=CLIMATE_FILE):
+    """The climate table (Date plus ATTACHED_COLUMNS, ascending), empty if it was never backfilled. Never fetches."""
+    if not Path(path).exists():
+        return pd.DataFrame({"Date": pd.Series(dtype="datetime64[ns]"), **{col: pd.Series(dtype="float32") for col in ATTACHED_COLUMNS}})
+    df = pd.read_parquet(path)
+    df["Date"] = df["Date"].astype("datetime64[ns]")
+    return df
+
+def climate_signature(path=CLIMATE_FILE):
+    """(size, mtime) of the climate table, so data joined with it is rebuilt after a backfill; None without one."""
+    path = Path(path)
+    return [path.stat().st_size, path.stat().st_mtime_ns] if path.exists() else None
+
+def attach(df, climate, date_column="Date"):
+    """
+    df with ATTACHED_COLUMNS joined on as of each row's day: that day's
+    weather, or the latest earlier day within ASOF_TOLERANCE_DAYS, else NaN.
+    One binary search over the climate dates for all rows; row order is kept.
+    """
+    days = pd.to_datetime(df[date_column]).to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    climate_days = climate["Date"].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    pos = np.searchsorted(climate_days, days, side="right") - 1
+    found = (pos >= 0) & ~np.isnat(days)
+    found[found] = (days[found] - climate_days[pos[found]]).astype(np.int64) <= ASOF_TOLERANCE_DAYS
+    joined = {}
+    for col in ATTACHED_COLUMNS:
+        values = climate[col].to_numpy(dtype=np.float32)
+        joined[col] = np.where(found, values[np.where(found, pos, 0)] if len(values) else np.nan, np.nan).astype(np.float32)
+    return df.assign(**joined)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily climate table maintenance")
+    parser.add_argument("command", choices=["backfill"], help="backfill: fill every missing day since --start and rewrite the climate table")
+    parser.add_argument("--start", default=CLIMATE_START.isoformat())
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--file", default=None, help="read days from a local CSV (weather_data.csv layout) instead of the archive")
+    args = parser.parse_args()
+    timing.begin_run("weather_backfill")
+    with timing.stage("weather.backfill") as t:
+        t["rows_out"] = backfill(start=args.start, end=args.end, source_file=args.file)
+    print(f"Added {t['rows_out']} day(s); climate table written to {CLIMATE_FILE}.")